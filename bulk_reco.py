@@ -0,0 +1,216 @@
+"""
+Offline bulk scoring: recommendations of one model for all users.
+
+The pipeline is loaded once and the users are scored in chunks by
+forked worker processes that share its memory-mapped artifacts.
+Every finished chunk is saved as a part next to the output, so an
+interrupted run started again with the same model files, users
+and arguments skips them.
+The merged result is a column store table with user_id, item_id and
+rank, usable as ``offline_reco_path`` of the KNN model:
+
+    python bulk_reco.py bmp25 ./service/data/knn/bmp25_bulk.csv
+
+Users are taken from interactions or from ``--users`` csv file
+with a user_id column.
+"""
+import argparse
+import gc
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import yaml
+from tqdm import tqdm
+
+from service.models_inference.registry import ModelRegistry
+from service.models_inference.run_reco_pipeline import MainPipeline
+from service.utils import Columns
+from service.utils.columnar import (
+    columnar_path,
+    file_stamp,
+    read_columns,
+    write_table,
+)
+from service.utils.common_artifact import interactions
+
+PARTS_SUFFIX = ".parts"
+META_FILE = "meta.yml"
+
+# set before the pool is forked, so workers use the loaded pipeline
+pipeline: tp.Optional[MainPipeline] = None
+
+
+def load_user_ids(users_path: tp.Optional[str] = None) -> np.ndarray:
+    if users_path is None:
+        return np.unique(interactions[Columns.User].values)
+    return np.unique(read_columns(users_path, [Columns.User])[Columns.User])
+
+
+def _users_hash(user_ids: np.ndarray) -> str:
+    return hashlib.sha256(
+        np.ascontiguousarray(user_ids, dtype=np.int64).tobytes()
+    ).hexdigest()
+
+
+def _model_files(config: tp.Any) -> tp.Dict[str, tp.Dict[str, int]]:
+    """
+    Stamps of the files the model config refers to,
+    following the yml configs it refers to.
+    """
+    stamps: tp.Dict[str, tp.Dict[str, int]] = dict()
+    if isinstance(config, dict):
+        config = list(config.values())
+    if isinstance(config, list):
+        for value in config:
+            stamps.update(_model_files(value))
+    elif isinstance(config, str) and os.path.isfile(config):
+        stamps[config] = file_stamp(config)
+        if config.endswith(".yml"):
+            with open(config) as file:
+                stamps.update(_model_files(yaml.safe_load(file)))
+    return stamps
+
+
+def _part_path(parts_path: str, chunk_idx: int) -> str:
+    """
+    Table path of the chunk part, stored as ``part_*.columns``.
+    """
+    return os.path.join(parts_path, f"part_{chunk_idx:06d}.csv")
+
+
+def _part_done(parts_path: str, chunk_idx: int) -> bool:
+    return os.path.isdir(columnar_path(_part_path(parts_path, chunk_idx)))
+
+
+def _check_parts(parts_path: str, meta: tp.Dict[str, tp.Any]) -> None:
+    """
+    Parts of a previous run are reused only if they were made
+    with the same model, users and arguments.
+    """
+    meta_path = os.path.join(parts_path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            if yaml.safe_load(file) != meta:
+                raise ValueError(
+                    f"{parts_path} was made with another model, users "
+                    f"or arguments, "
+                    f"remove it to start over"
+                )
+        return
+
+    os.makedirs(parts_path, exist_ok=True)
+    with open(meta_path, "w") as file:
+        yaml.safe_dump(meta, file)
+
+
+def score_chunk(task: tp.Tuple[int, np.ndarray, int, str]) -> int:
+    chunk_idx, user_ids, k_recs, parts_path = task
+    recs = pipeline.recommend_batch(user_ids.tolist(), k_recs)
+
+    lengths = [len(user_recs) for user_recs in recs]
+    part = pd.DataFrame({
+        Columns.User: np.repeat(user_ids, lengths),
+        Columns.Item: np.array(
+            [item for user_recs in recs for item in user_recs],
+            dtype=np.int64,
+        ),
+        Columns.Rank: np.concatenate(
+            [np.arange(1, length + 1) for length in lengths] + [[]]
+        ).astype(np.int32),
+    })
+
+    # written aside and renamed, so a part on disk is always complete
+    path = columnar_path(_part_path(parts_path, chunk_idx))
+    write_table(part, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return len(user_ids)
+
+
+def merge_parts(parts_path: str, n_chunks: int, output: str) -> str:
+    parts = [
+        pd.DataFrame(read_columns(
+            _part_path(parts_path, chunk_idx),
+            [Columns.User, Columns.Item, Columns.Rank],
+        ))
+        for chunk_idx in range(n_chunks)
+    ]
+    path = columnar_path(output)
+    write_table(pd.concat(parts, ignore_index=True), path)
+    shutil.rmtree(parts_path)
+    return path
+
+
+def run(args: argparse.Namespace) -> None:
+    global pipeline  # pylint: disable=global-statement
+
+    started_at = time.perf_counter()
+    with open(args.pipeline_config) as models_config:
+        models_params = yaml.safe_load(models_config)["models"]
+    pipeline = MainPipeline(models_params[args.model_name])
+    user_ids = load_user_ids(args.users)
+    print(f"Pipeline loaded in {time.perf_counter() - started_at:.1f}s")
+
+    chunks = np.array_split(
+        user_ids, max(1, int(np.ceil(len(user_ids) / args.chunk_size)))
+    )
+    parts_path = columnar_path(args.output) + PARTS_SUFFIX
+    _check_parts(parts_path, {
+        "model_name": args.model_name,
+        "model": models_params[args.model_name],
+        "model_files": _model_files(models_params[args.model_name]),
+        "k_recs": args.k_recs,
+        "chunk_size": args.chunk_size,
+        "users": len(user_ids),
+        "users_sha256": _users_hash(user_ids),
+    })
+
+    tasks = [
+        (chunk_idx, chunk, args.k_recs, parts_path)
+        for chunk_idx, chunk in enumerate(chunks)
+        if not _part_done(parts_path, chunk_idx)
+    ]
+    print(f"{len(chunks) - len(tasks)} of {len(chunks)} chunks already done")
+
+    # loaded objects are moved out of gc, so forked workers share them
+    gc.freeze()
+
+    started_at = time.perf_counter()
+    scored = 0
+    progress = tqdm(total=sum(len(task[1]) for task in tasks), unit="user")
+    context = multiprocessing.get_context("fork")
+    with context.Pool(args.workers) as pool:
+        for n_users in pool.imap_unordered(score_chunk, tasks):
+            scored += n_users
+            progress.update(n_users)
+    progress.close()
+
+    seconds = time.perf_counter() - started_at
+    print(
+        f"Scored {scored} users in {seconds:.1f}s, "
+        f"{scored / max(seconds, 1e-9):.0f} users/sec"
+    )
+    print(f"Saved to {merge_parts(parts_path, len(chunks), args.output)}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("model_name", help="model of pipeline config")
+    parser.add_argument("output", help="csv path of the result table")
+    parser.add_argument("--users", help="csv file with user_id column")
+    parser.add_argument("--k-recs", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--pipeline-config", default=ModelRegistry.path_pipeline,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -1,7 +1,11 @@
+import gc
+import os
+import signal
 from multiprocessing import cpu_count
 from os import getenv as env
 
 from service import log, settings
+from service.utils.artifact_store import artifact_store
 
 # The socket to bind.
 host = env("HOST", "0.0.0.0")
@@ -72,7 +76,8 @@ limit_request_fields = env("GUNICORN_LIMIT_REQUEST_FIELDS", 64)
 limit_request_field_size = env("GUNICORN_LIMIT_REQUEST_FIELD_SIZE", 128)
 
 # Load application code before the worker processes are forked.
-preload_app = env("GUNICORN_PRELOAD_APP", False)
+# Artifacts are then loaded once in the master and shared copy-on-write.
+preload_app = env("GUNICORN_PRELOAD_APP", True)
 
 # Disables the use of sendfile.
 sendfile = env("GUNICORN_SENDFILE", True)
@@ -103,3 +108,38 @@ tmp_upload_dir = env("GUNICORN_TMP_UPLOAD_DIR", None)
 
 # Front-end’s IPs from which allowed to handle set secure headers.
 forwarded_allow_ips = env("GUNICORN_FORWARDER_ALLOW_IPS", "127.0.0.1")
+
+
+def when_ready(server):
+    """
+    Called in the master after the preloaded app is ready, before fork.
+    Moves loaded objects to the permanent GC generation, so the cyclic
+    collector in workers does not write to (and unshare) their pages.
+    """
+    gc.freeze()
+
+    for name, usage in artifact_store.memory_report().items():
+        server.log.info(f"Artifact {name}: {usage}")
+
+    if server.cfg.preload_app:
+        start_reload(server)
+
+
+def start_reload(server):
+    """
+    Reloads models in the master on POST /admin/reload, then restarts
+    the workers gracefully (as on SIGHUP): new workers are forked from
+    the master and share the new models.
+    """
+    # pylint: disable=import-outside-toplevel
+    from service.api.app import reload_in_master
+
+    def restart_workers():
+        # old models are collected, new ones are frozen as on startup
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        server.log.info("Models reloaded, restarting workers")
+        os.kill(os.getpid(), signal.SIGHUP)
+
+    reload_in_master(settings.get_config(), restart_workers)
@@ -1,17 +1,27 @@
 import asyncio
 from concurrent.futures.thread import ThreadPoolExecutor
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
 import uvloop
 from fastapi import FastAPI
 
 from ..log import app_logger, setup_logging
 from ..settings import ServiceConfig
+from .cache import RecoCache
 from .exception_handlers import add_exception_handlers
+from .inference import InferenceExecutor
 from .middlewares import add_middlewares
-from .views import add_views
+from .reload import ModelReloader, Stamps, reloads_in_master, stamps_version
+from .views import (
+    Models,
+    add_views,
+    build_models,
+    served_stamps,
+    swap_models,
+    watched_files,
+)
 
-__all__ = ("create_app",)
+__all__ = ("create_app", "reload_in_master")
 
 
 def setup_asyncio(thread_name_prefix: str) -> None:
@@ -29,13 +39,76 @@ def setup_asyncio(thread_name_prefix: str) -> None:
     loop.set_exception_handler(handler)
 
 
+def add_inference_executor(app: FastAPI, config: ServiceConfig) -> None:
+    # created on startup, so pools are not forked with a preloaded app
+    def startup() -> None:
+        app.state.inference_executor = InferenceExecutor.from_config(
+            config.inference_config
+        )
+        app.state.micro_batchers = dict()
+
+        def swap(models: Models, stamps: Stamps) -> None:
+            swap_models(models, stamps)
+            app.state.micro_batchers = dict()
+            app.state.inference_executor.renew()
+            # after the swap, so results of old models are not cached
+            if app.state.reco_cache is not None:
+                app.state.reco_cache.invalidate(stamps_version(stamps))
+
+        app.state.model_reloader = ModelReloader.from_config(
+            config.reload_config,
+            build=build_models,
+            swap=swap,
+            watch_paths=watched_files,
+            stamps=served_stamps(),
+        )
+        # entries of workers serving other models are not shared
+        app.state.reco_cache = RecoCache.from_config(
+            config.cache_config, version=app.state.model_reloader.version,
+        )
+        # workers of a reloading master are restarted instead
+        if not reloads_in_master():
+            app.state.model_reloader.start()
+
+    def shutdown() -> None:
+        app.state.model_reloader.stop()
+        app.state.inference_executor.shutdown()
+
+    app.add_event_handler("startup", startup)
+    app.add_event_handler("shutdown", shutdown)
+
+
+def reload_in_master(
+    config: ServiceConfig,
+    on_reload: Callable[[], None],
+) -> None:
+    """
+    Reload models in the preloaded gunicorn master, ``on_reload``
+    restarts the workers after the swap, so they are forked again
+    and share the new models.
+    """
+    def swap(models: Models, stamps: Stamps) -> None:
+        swap_models(models, stamps)
+        on_reload()
+
+    ModelReloader.from_config(
+        config.reload_config,
+        build=build_models,
+        swap=swap,
+        watch_paths=watched_files,
+        stamps=served_stamps(),
+    ).start_in_master()
+
+
 def create_app(config: ServiceConfig) -> FastAPI:
     setup_logging(config)
     setup_asyncio(thread_name_prefix=config.service_name)
 
     app = FastAPI(debug=False)
     app.state.k_recs = config.k_recs
+    app.state.batching_config = config.batching_config
 
+    add_inference_executor(app, config)
     add_views(app)
     add_middlewares(app)
     add_exception_handlers(app)
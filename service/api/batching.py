@@ -0,0 +1,76 @@
+import asyncio
+import typing as tp
+
+from service.log import app_logger
+
+T = tp.TypeVar("T")
+
+
+class MicroBatcher(tp.Generic[T]):
+    """
+    Gathers concurrent requests into one batched call.
+
+    A request waits at most ``max_wait`` seconds for other requests;
+    the batch is sent earlier once it reaches ``max_batch_size``.
+    ``run_batch`` gets the collected keys and must return one result
+    per key in the same order.
+    """
+
+    def __init__(
+        self,
+        run_batch: tp.Callable[[tp.List[int]], tp.Awaitable[tp.List[T]]],
+        max_batch_size: int = 64,
+        max_wait: float = 0.002,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: tp.List[tp.Tuple[int, asyncio.Future]] = []
+        self._flush_handle: tp.Optional[asyncio.TimerHandle] = None
+        # the loop keeps only weak references to running tasks
+        self._tasks: tp.Set[asyncio.Future] = set()
+
+    async def submit(self, key: int) -> T:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((key, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            app_logger.error(f"Micro-batch failed: {task.exception()!r}")
+
+    async def _run(
+        self,
+        batch: tp.List[tp.Tuple[int, asyncio.Future]],
+    ) -> None:
+        try:
+            results = await self.run_batch([key for key, _ in batch])
+        except Exception as exc:  # pylint: disable=W0703
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import typing as tp
+from collections import OrderedDict
+
+from service.log import app_logger
+from service.settings import CacheConfig
+
+Recs = tp.List[int]
+
+
+class MemoryBackend:
+    """
+    In-process LRU storage of at most ``max_size`` entries.
+    """
+
+    blocking = False
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tp.Tuple[float, Recs]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> tp.Optional[Recs]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Recs, now: float, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteBackend:
+    """
+    Storage in a sqlite file shared by the workers of one host,
+    so cached results survive worker restarts. Entries are evicted
+    in the order of their last access, the size is trimmed back to
+    ``max_size`` every ``evict_every`` writes.
+
+    Hits only read the file: their access times are kept in memory
+    and written with the next write, so the eviction order is
+    approximate across workers. Calls may wait ``timeout`` seconds
+    for the file lock held by another worker, a failed call is
+    a cache miss.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int = 100_000,
+        evict_every: int = 1000,
+        timeout: float = 1.0,
+    ):
+        self.max_size = max_size
+        self.evict_every = evict_every
+        self._writes = 0
+        self._accessed: tp.Dict[str, float] = dict()
+        self._connection = sqlite3.connect(
+            path, timeout=timeout, check_same_thread=False,
+            isolation_level=None,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS reco_cache ("
+            "key TEXT PRIMARY KEY, value TEXT, "
+            "expires_at REAL, accessed_at REAL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS reco_cache_accessed_at "
+            "ON reco_cache (accessed_at)"
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connection.execute(
+                    "SELECT COUNT(*) FROM reco_cache"
+                ).fetchone()[0]
+        except sqlite3.Error as exc:
+            app_logger.warning(f"Reco cache count failed: {exc!r}")
+            return 0
+
+    def get(self, key: str, now: float) -> tp.Optional[Recs]:
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT value FROM reco_cache "
+                    "WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                self._accessed[key] = now
+        except sqlite3.Error as exc:
+            app_logger.warning(f"Reco cache read failed: {exc!r}")
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Recs, now: float, ttl: float) -> None:
+        try:
+            with self._lock:
+                accessed, self._accessed = self._accessed, dict()
+                self._connection.executemany(
+                    "UPDATE reco_cache SET accessed_at = ? WHERE key = ?",
+                    ((at, hit) for hit, at in accessed.items()),
+                )
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO reco_cache VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + ttl, now),
+                )
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict(now)
+        except sqlite3.Error as exc:
+            app_logger.warning(f"Reco cache write failed: {exc!r}")
+
+    def _evict(self, now: float) -> None:
+        self._connection.execute(
+            "DELETE FROM reco_cache WHERE expires_at <= ?", (now,),
+        )
+        self._connection.execute(
+            "DELETE FROM reco_cache WHERE key IN ("
+            "SELECT key FROM reco_cache ORDER BY accessed_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+
+    def clear(self) -> None:
+        try:
+            with self._lock:
+                self._accessed.clear()
+                self._connection.execute("DELETE FROM reco_cache")
+        except sqlite3.Error as exc:
+            app_logger.warning(f"Reco cache clear failed: {exc!r}")
+
+
+class RecoCache:
+    """
+    Recommendations cache keyed by (version, model_name, user_id, k_recs).
+
+    Entries live ``ttl`` seconds. ``version`` is the version of the
+    served models, so a shared backend never returns entries stored
+    by a worker that serves other models. ``invalidate`` switches to
+    the version of reloaded models, drops all entries and starts
+    a new generation: results computed before it are not stored.
+    """
+
+    def __init__(
+        self,
+        backend: tp.Union[MemoryBackend, SqliteBackend],
+        ttl: float = 300.0,
+        clock: tp.Callable[[], float] = time.time,
+        version: str = "",
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.clock = clock
+        self.version = version
+
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(
+        cls,
+        config: CacheConfig,
+        version: str = "",
+    ) -> tp.Optional["RecoCache"]:
+        if not config.enabled:
+            return None
+
+        backend: tp.Union[MemoryBackend, SqliteBackend]
+        if config.backend == "sqlite":
+            backend = SqliteBackend(config.sqlite_path, config.max_size)
+        else:
+            backend = MemoryBackend(config.max_size)
+        return cls(backend, ttl=config.ttl, version=version)
+
+    def _key(self, model_name: str, user_id: int, k_recs: int) -> str:
+        return f"{self.version}:{model_name}:{user_id}:{k_recs}"
+
+    def get(
+        self,
+        model_name: str,
+        user_id: int,
+        k_recs: int,
+    ) -> tp.Optional[Recs]:
+        recs = self.backend.get(
+            self._key(model_name, user_id, k_recs), self.clock(),
+        )
+        if recs is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return recs
+
+    def set(
+        self,
+        model_name: str,
+        user_id: int,
+        k_recs: int,
+        recs: Recs,
+        generation: tp.Optional[int] = None,
+    ) -> None:
+        """
+        Store recs unless they were computed before invalidation,
+        ``generation`` is the value read before computing them.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.backend.set(
+                self._key(model_name, user_id, k_recs),
+                list(recs),
+                self.clock(),
+                self.ttl,
+            )
+
+    async def get_async(
+        self,
+        model_name: str,
+        user_id: int,
+        k_recs: int,
+    ) -> tp.Optional[Recs]:
+        """
+        ``get`` run in a thread if the backend may wait on a file lock,
+        so the event loop is not blocked.
+        """
+        if not self.backend.blocking:
+            return self.get(model_name, user_id, k_recs)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.get, model_name, user_id, k_recs,
+        )
+
+    async def set_async(
+        self,
+        model_name: str,
+        user_id: int,
+        k_recs: int,
+        recs: Recs,
+        generation: tp.Optional[int] = None,
+    ) -> None:
+        """
+        ``set`` run in a thread if the backend may wait on a file lock.
+        """
+        if not self.backend.blocking:
+            return self.set(model_name, user_id, k_recs, recs, generation)
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.set, model_name, user_id, k_recs, recs, generation,
+        )
+
+    def invalidate(self, version: tp.Optional[str] = None) -> None:
+        with self._lock:
+            if version is not None:
+                self.version = version
+            self.generation += 1
+            self.backend.clear()
+
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "size": len(self.backend),
+            "version": self.version,
+            "generation": self.generation,
+        }
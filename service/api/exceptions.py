@@ -39,6 +39,17 @@ class ModelNotFoundError(AppException):
         super().__init__(status_code, error_key, error_message, error_loc)
 
 
+class ServiceOverloadedError(AppException):
+    def __init__(
+        self,
+        status_code: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        error_key: str = "service_overloaded",
+        error_message: str = "Too many requests in inference queue",
+        error_loc: tp.Optional[tp.Sequence[str]] = None,
+    ):
+        super().__init__(status_code, error_key, error_message, error_loc)
+
+
 class AuthenticateError(AppException):
     def __init__(
         self,
@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import threading
+import typing as tp
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import ProcessPoolExecutor
+from concurrent.futures.thread import ThreadPoolExecutor
+
+from service.log import app_logger
+from service.settings import InferenceConfig
+
+from .exceptions import ServiceOverloadedError
+
+T = tp.TypeVar("T")
+
+
+class InferenceExecutor:
+    """
+    Dedicated pool for CPU-bound model calls, so they do not block
+    the event loop of the worker.
+
+    At most ``max_workers + max_queue_size`` calls may be in flight,
+    further calls are rejected with ``ServiceOverloadedError``.
+    A call that does not finish in ``timeout`` seconds is answered
+    with ``fallback()``; it keeps its slot until it really finishes.
+    A process pool forks from the worker, so ``func`` must be a
+    module level function that uses already loaded artifacts,
+    and the pool is renewed when models are loaded or reloaded.
+    """
+
+    def __init__(
+        self,
+        executor: str = "thread",
+        max_workers: int = 4,
+        max_queue_size: int = 64,
+        timeout: float = 1.0,
+    ):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue_size
+        self.timeout = timeout
+
+        self._pool = self._create_pool()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _create_pool(self) -> Executor:
+        if self.executor == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("fork"),
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference",
+        )
+
+    @classmethod
+    def from_config(cls, config: InferenceConfig) -> "InferenceExecutor":
+        return cls(
+            executor=config.executor,
+            max_workers=config.max_workers,
+            max_queue_size=config.max_queue_size,
+            timeout=config.timeout,
+        )
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, func: tp.Callable[..., T], *args: tp.Any) -> Future:
+        # submitted under the lock, so the pool is not renewed meanwhile
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ServiceOverloadedError()
+            future = self._pool.submit(func, *args)
+            self._pending += 1
+
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(
+        self,
+        func: tp.Callable[..., T],
+        *args: tp.Any,
+        fallback: tp.Callable[[], T],
+        timeout: tp.Optional[float] = None,
+    ) -> T:
+        """
+        Result of ``func(*args)``, ``fallback()`` after ``timeout``
+        seconds, the executor timeout by default.
+        """
+        future = self._submit(func, *args)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                self.timeout if timeout is None else timeout,
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            app_logger.warning(
+                f"Inference {func.__name__}{args} timed out, "
+                f"fallback is used"
+            )
+            return fallback()
+
+    def renew(self) -> None:
+        """
+        Replace forked workers after models are reloaded, so new calls
+        see the new models. Calls in flight finish in the old pool.
+        """
+        if self.executor != "process":
+            return
+        with self._lock:
+            pool, self._pool = self._pool, self._create_pool()
+        pool.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import threading
+import time
+import typing as tp
+import uuid
+
+from service.log import app_logger
+from service.settings import ReloadConfig
+
+T = tp.TypeVar("T")
+
+Stamp = tp.Optional[tp.Tuple[int, int]]
+Stamps = tp.Dict[str, Stamp]
+
+# set in the preloaded gunicorn master that reloads models for workers
+master_reloader: tp.Optional["ModelReloader"] = None
+
+
+def file_stamps(paths: tp.Iterable[str]) -> Stamps:
+    """
+    Size and modification time of every file, None if it is missing.
+    """
+    stamps: Stamps = dict()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stamps[path] = None
+        else:
+            stamps[path] = (stat.st_size, stat.st_mtime_ns)
+    return stamps
+
+
+def stamps_version(stamps: Stamps) -> str:
+    """
+    Version of models loaded from files with ``stamps``, the same
+    in every worker that loaded the same files.
+    """
+    return hashlib.sha1(
+        repr(sorted(stamps.items())).encode()
+    ).hexdigest()[:16]
+
+
+def write_generation(path: str) -> None:
+    """
+    Request a reload by replacing the generation file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w") as file:
+        file.write(uuid.uuid4().hex)
+    os.replace(path + ".tmp", path)
+
+
+def reloads_in_master() -> bool:
+    """
+    Whether models are reloaded by the gunicorn master of this worker.
+    """
+    return master_reloader is not None
+
+
+class ModelReloader(tp.Generic[T]):
+    """
+    Rebuilds served models in a background thread and swaps them in.
+
+    ``build`` loads new models while the current ones keep serving,
+    ``swap`` installs them with the stamps of the files they were
+    loaded from; requests that already hold the old models finish
+    on them. A failed build leaves the current models in place.
+
+    The reloader polls the generation file every ``poll_interval``
+    seconds and reloads when it is replaced. With ``watch`` the files
+    from ``watch_paths`` are polled too and a reload starts once
+    a change stays unchanged for one more poll, so files that are
+    still being written are not loaded.
+
+    In a preloaded gunicorn master the reloader runs in the master,
+    which then restarts its workers, so every worker serves the same
+    models shared copy-on-write. Otherwise every worker polls and
+    reloads its own models.
+    """
+
+    def __init__(
+        self,
+        build: tp.Callable[[], T],
+        swap: tp.Callable[[T, Stamps], None],
+        generation_path: str,
+        watch_paths: tp.Callable[[], tp.List[str]],
+        stamps: Stamps,
+        watch: bool = False,
+        poll_interval: float = 2.0,
+    ):
+        self.build = build
+        self.swap = swap
+        self.generation_path = generation_path
+        self.watch_paths = watch_paths
+        self.watch = watch
+        self.poll_interval = poll_interval
+
+        self.stamps = stamps
+        self.generation = self._generation()
+        self.version = stamps_version(stamps)
+        self.reloads = 0
+        self.last_error: tp.Optional[str] = None
+        self.last_reload_seconds: tp.Optional[float] = None
+
+        # held while models are loaded and swapped in
+        self._loading = threading.Lock()
+        self._stopped = threading.Event()
+        self._poller: tp.Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: ReloadConfig,
+        build: tp.Callable[[], T],
+        swap: tp.Callable[[T, Stamps], None],
+        watch_paths: tp.Callable[[], tp.List[str]],
+        stamps: Stamps,
+    ) -> "ModelReloader[T]":
+        return cls(
+            build,
+            swap,
+            generation_path=config.generation_path,
+            watch_paths=watch_paths,
+            stamps=stamps,
+            watch=config.watch,
+            poll_interval=config.poll_interval,
+        )
+
+    @property
+    def reloading(self) -> bool:
+        return self._loading.locked()
+
+    def _generation(self) -> Stamp:
+        return file_stamps([self.generation_path])[self.generation_path]
+
+    def _reload(self, stamps: Stamps, generation: Stamp) -> None:
+        started_at = time.perf_counter()
+        # polled changes are handled by this reload even if it fails
+        self.stamps, self.generation = stamps, generation
+        try:
+            self.swap(self.build(), stamps)
+        except Exception as exc:  # pylint: disable=W0703
+            app_logger.exception("Reload of models failed")
+            self.last_error = repr(exc)
+        else:
+            self.version = stamps_version(stamps)
+            self.reloads += 1
+            self.last_error = None
+            self.last_reload_seconds = time.perf_counter() - started_at
+            app_logger.info(
+                f"Models reloaded to version {self.version} in "
+                f"{self.last_reload_seconds:.1f}s"
+            )
+        finally:
+            self._loading.release()
+
+    def reload(self, wait: bool = False) -> bool:
+        """
+        Reload models, False if a reload is already running.
+        """
+        if not self._loading.acquire(blocking=False):
+            return False
+
+        # stamps are taken before loading, a later change reloads again
+        thread = threading.Thread(
+            target=self._reload,
+            args=(file_stamps(self.watch_paths()), self._generation()),
+            name="model-reload",
+            daemon=True,
+        )
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def request(self) -> None:
+        """
+        Request a reload from every process polling the generation file,
+        this one reloads at once if it polls. A process that is reloading
+        reloads again after it finishes.
+        """
+        write_generation(self.generation_path)
+        if self._poller is not None:
+            self.reload()
+
+    def _poll(self) -> None:
+        pending: tp.Optional[Stamps] = None
+        while not self._stopped.wait(self.poll_interval):
+            if self.reloading:
+                continue
+
+            stamps = file_stamps(self.watch_paths())
+            if self._generation() != self.generation:
+                app_logger.info("Reload of models requested")
+                self.reload(wait=True)
+                pending = None
+            elif not self.watch or stamps == self.stamps:
+                pending = None
+            elif stamps == pending:
+                app_logger.info("Model files changed, reloading")
+                self.reload(wait=True)
+                pending = None
+            else:
+                pending = stamps
+
+    def start(self) -> None:
+        if self._poller is not None:
+            return
+        self._poller = threading.Thread(
+            target=self._poll, name="model-reload-poll", daemon=True,
+        )
+        self._poller.start()
+
+    def block_forks(self) -> None:
+        """
+        Make forks of this process wait while models are loaded, so a
+        child never starts from half-swapped models or with locks held
+        by the loading thread.
+        """
+        os.register_at_fork(
+            before=self._loading.acquire,
+            after_in_parent=self._loading.release,
+            after_in_child=self._loading.release,
+        )
+
+    def start_in_master(self) -> None:
+        """
+        Reload in the preloaded gunicorn master, workers forked from it
+        do not reload themselves.
+        """
+        global master_reloader  # pylint: disable=W0603
+
+        self.block_forks()
+        master_reloader = self
+        self.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def status(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "version": self.version,
+            "reloads": self.reloads,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+            "last_reload_seconds": self.last_reload_seconds,
+            "watching": self.watch,
+            "in_master": reloads_in_master(),
+        }
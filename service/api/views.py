@@ -1,23 +1,36 @@
-from typing import List
+import asyncio
+import glob
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import sentry_sdk
 import yaml
 from fastapi import APIRouter, Depends, FastAPI, Request, Security
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
 from sentry_sdk import capture_message
 
+from service.api.batching import MicroBatcher
 from service.api.exceptions import (
     AuthenticateError,
     ModelNotFoundError,
+    ServiceOverloadedError,
     UserNotFoundError,
 )
+from service.api.reload import Stamps, file_stamps
 from service.casual_inference import ModelOutputExplain
 from service.configs.responses_cfg import example_responses
 from service.log import app_logger
 from service.models_inference.popular.reco_popular import add_reco_popular
-from service.models_inference.run_reco_pipeline import MainPipeline
-from service.utils.common_artifact import explained_model, registered_model
+from service.models_inference.registry import ModelRegistry
+from service.utils.artifact_store import ArtifactStore, artifact_store
+from service.utils.columnar import CONFIGS_PATTERN, configured_tables
+from service.utils.common_artifact import (
+    COMMON_ARTIFACTS,
+    data,
+    explained_model,
+)
 
 with open('./service/envs/authentication_env.yaml') as env_config:
     ENV_TOKEN = yaml.safe_load(env_config)
@@ -30,20 +43,258 @@ sentry_sdk.init(
     traces_sample_rate=1.0
 )
 
-pipeline = MainPipeline()
+
+def watched_files() -> List[str]:
+    """
+    Configs and model files whose change triggers a reload,
+    common data is loaded once and is not watched.
+    """
+    common = {data["popular_items"], data["interactions"]}
+    files = sorted(glob.glob(CONFIGS_PATTERN))
+    for suffix in (".dill", ".npy", ".csv"):
+        files.extend(
+            path for path in configured_tables(suffix) if path not in common
+        )
+    return files
+
+
+# taken before loading, files changed later are loaded by a reload
+models_stamps = file_stamps(watched_files())
+model_registry = ModelRegistry()
 model_output_explain = ModelOutputExplain(explained_model)
 
+Models = Tuple[ArtifactStore, ModelRegistry, ModelOutputExplain]
+
+
+def build_models() -> Models:
+    """
+    New registry and explainer loaded from the current files,
+    the pipelines in use are warmed before they are swapped in.
+    """
+    store = artifact_store.staging(keep=COMMON_ARTIFACTS)
+    with artifact_store.loading_into(store):
+        registry = ModelRegistry()
+        registry.warm(list(model_registry.pipelines))
+        explainer = ModelOutputExplain(explained_model)
+    return store, registry, explainer
+
+
+def served_stamps() -> Stamps:
+    """
+    Stamps of the files the served models were loaded from.
+    """
+    return models_stamps
+
+
+def swap_models(models: Models, stamps: Stamps) -> None:
+    """
+    Serve new models, calls in flight finish on the old ones.
+    """
+    global model_registry, model_output_explain  # pylint: disable=W0603
+    global models_stamps  # pylint: disable=W0603
+
+    store, registry, explainer = models
+    artifact_store.replace(store)
+    model_registry, model_output_explain = registry, explainer
+    models_stamps = stamps
+
+
+def recommend(model_name: str, user_id: int, k_recs: int) -> List[int]:
+    recs = model_registry.get(model_name).recommend(
+        user_id=user_id, k_recs=k_recs,
+    )
+    return add_reco_popular(k_recs=k_recs, curr_recs=recs, user_id=user_id)
+
+
+def recommend_batch(
+    model_name: str,
+    user_ids: List[int],
+    k_recs: int,
+) -> List[List[int]]:
+    recs = model_registry.get(model_name).recommend_batch(
+        user_ids=user_ids, k_recs=k_recs,
+    )
+    return [
+        add_reco_popular(k_recs=k_recs, curr_recs=user_recs, user_id=user_id)
+        for user_id, user_recs in zip(user_ids, recs)
+    ]
+
+
+async def load_pipeline(app: FastAPI, model_name: str) -> None:
+    """
+    Load the model before the timed inference call, so its first
+    requests wait for the load instead of getting the fallback.
+    A process pool forked before the load is renewed, so its workers
+    share the loaded model instead of loading their own copies.
+    """
+    registry = model_registry
+    if not registry.loaded(model_name):
+        await asyncio.get_event_loop().run_in_executor(
+            None, registry.get, model_name,
+        )
+        app.state.inference_executor.renew()
+
+
+def get_micro_batcher(app: FastAPI, model_name: str) -> MicroBatcher:
+    """
+    Batcher of concurrent requests to the model, one per model.
+    """
+    if model_name not in app.state.micro_batchers:
+        k_recs = app.state.k_recs
+        executor = app.state.inference_executor
+
+        async def run_batch(
+            user_ids: List[int],
+        ) -> List[Optional[List[int]]]:
+            return await executor.run(
+                recommend_batch, model_name, user_ids, k_recs,
+                fallback=lambda: [None] * len(user_ids),
+            )
+
+        app.state.micro_batchers[model_name] = MicroBatcher(
+            run_batch,
+            max_batch_size=app.state.batching_config.max_batch_size,
+            max_wait=app.state.batching_config.max_wait_ms / 1000,
+        )
+    return app.state.micro_batchers[model_name]
+
+
+def explain_item(
+    model_name: str,
+    user_id: int,
+    item_id: int,
+) -> Tuple[int, str]:
+    return model_output_explain.explain(model_name, user_id, item_id)
+
+
+def explain_items(
+    model_name: str,
+    user_id: int,
+    item_ids: List[int],
+) -> List[Tuple[int, str]]:
+    return model_output_explain.explain_items(model_name, user_id, item_ids)
+
+
+async def iterate_user_ids(values: List[Any]) -> AsyncIterator[Any]:
+    for value in values:
+        yield value
+
+
+def ndjson_lines(body: bytes) -> List[bytes]:
+    """
+    Non-empty lines of an NDJSON body.
+    """
+    return [line for line in body.split(b"\n") if line.strip()]
+
+
+def parse_user_id(value: Any) -> int:
+    if isinstance(value, int):
+        return value
+    value = json.loads(value)
+    if isinstance(value, dict):
+        value = value["user_id"]
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"User id {value!r} is not an integer")
+    return value
+
+
+def user_lines(user_ids: List[int], **fields: Any) -> str:
+    """
+    One NDJSON line per user with the same ``fields``.
+    """
+    return "".join(
+        json.dumps({"user_id": user_id, **fields}) + "\n"
+        for user_id in user_ids
+    )
+
+
+async def run_reco_chunk(
+    request: Request,
+    model_name: str,
+    user_ids: List[int],
+) -> str:
+    """
+    NDJSON lines of one chunk of the batch endpoint, error lines
+    for its users if it timed out or was rejected.
+    """
+    batching_config = request.app.state.batching_config
+    try:
+        recs = await request.app.state.inference_executor.run(
+            recommend_batch, model_name, user_ids, request.app.state.k_recs,
+            fallback=lambda: None,
+            timeout=batching_config.stream_timeout,
+        )
+    except ServiceOverloadedError as exc:
+        return user_lines(user_ids, error_key=exc.error_key)
+
+    if recs is None:
+        return user_lines(user_ids, error_key="inference_timeout")
+    return "".join(
+        json.dumps({"user_id": user_id, "items": items}) + "\n"
+        for user_id, items in zip(user_ids, recs)
+    )
+
+
+async def stream_reco_batch(
+    request: Request,
+    model_name: str,
+    values: AsyncIterator[Any],
+) -> AsyncIterator[str]:
+    """
+    NDJSON lines with recommendations, sent after each chunk of users.
+    """
+    chunk_size = request.app.state.batching_config.stream_chunk_size
+
+    user_ids: List[int] = list()
+    async for value in values:
+        try:
+            user_id = parse_user_id(value)
+        except (ValueError, KeyError, TypeError) as exc:
+            yield json.dumps({
+                "error_key": "invalid_user_id", "error_message": str(exc),
+            }) + "\n"
+            continue
+
+        if user_id > 10 ** 9:
+            yield user_lines([user_id], error_key="user_not_found")
+            continue
+
+        user_ids.append(user_id)
+        if len(user_ids) >= chunk_size:
+            yield await run_reco_chunk(request, model_name, user_ids)
+            user_ids = list()
+
+    if user_ids:
+        yield await run_reco_chunk(request, model_name, user_ids)
+
 
 class RecoResponse(BaseModel):
     user_id: int
     items: List[int]
 
 
+class BatchRecoRequest(BaseModel):
+    user_ids: List[int]
+
+
 class ExplainResponse(BaseModel):
     score: int
     explanation: str
 
 
+class BatchExplainRequest(BaseModel):
+    item_ids: List[int]
+
+
+class ItemExplainResponse(ExplainResponse):
+    item_id: int
+
+
+class BatchExplainResponse(BaseModel):
+    user_id: int
+    explanations: List[ItemExplainResponse]
+
+
 router = APIRouter()
 auth_scheme = HTTPBearer(auto_error=False)
 
@@ -67,6 +318,67 @@ async def health(
     return "I am alive"
 
 
+@router.get(
+    path="/health/artifacts",
+    tags=["Health"],
+)
+async def artifacts_memory(
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token)
+) -> Dict[str, Dict[str, Any]]:
+    """Resident and shared memory and load time of every loaded
+    artifact in the worker that serves the request, for the HNSW
+    index also whether it was loaded or built.
+    """
+    return artifact_store.memory_report()
+
+
+@router.get(
+    path="/health/cache",
+    tags=["Health"],
+)
+async def cache_stats(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token)
+) -> Dict[str, Any]:
+    """Hits and misses of the recommendations cache
+    in the worker that serves the request.
+    """
+    reco_cache = request.app.state.reco_cache
+    return reco_cache.stats() if reco_cache is not None else {}
+
+
+@router.get(
+    path="/health/reload",
+    tags=["Health"],
+)
+async def reload_status(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token)
+) -> Dict[str, Any]:
+    """Version of the models and state of the last reload
+    in the worker that serves the request.
+    """
+    return request.app.state.model_reloader.status()
+
+
+@router.post(
+    path="/admin/reload",
+    tags=["Admin"],
+)
+async def reload_models(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token)
+) -> Dict[str, Any]:
+    """Reload models from their files in the background
+    in every worker: at once in the worker that serves the request,
+    the others follow within the reload poll interval. Requests are
+    served by the current models until the new ones are loaded.
+    """
+    reloader = request.app.state.model_reloader
+    reloader.request()
+    return reloader.status()
+
+
 @router.get(
     path="/reco/{model_name}/{user_id}",
     tags=["Recommendations"],
@@ -81,7 +393,7 @@ async def get_reco(
 ) -> RecoResponse:
     app_logger.info(f"Request for model: {model_name}, user_id: {user_id}")
 
-    if model_name not in registered_model:
+    if model_name not in model_registry:
         capture_message(f"Model name '{model_name}' not found")
         raise ModelNotFoundError(
             error_message=f"Model name '{model_name}' not found"
@@ -92,19 +404,89 @@ async def get_reco(
         raise UserNotFoundError(error_message=f"User {user_id} not found")
 
     k_recs = request.app.state.k_recs
+    reco_cache = request.app.state.reco_cache
+
+    if reco_cache is not None:
+        recs = await reco_cache.get_async(model_name, user_id, k_recs)
+        if recs is not None:
+            return RecoResponse(user_id=user_id, items=recs)
+        generation = reco_cache.generation
+
+    await load_pipeline(request.app, model_name)
+
+    # fallback is None, so popular items after timeout are not cached
+    if model_registry.micro_batching(model_name):
+        recs = await get_micro_batcher(request.app, model_name).submit(
+            user_id
+        )
+    else:
+        recs = await request.app.state.inference_executor.run(
+            recommend, model_name, user_id, k_recs,
+            fallback=lambda: None,
+        )
 
-    recs = pipeline.recommend(user_id=user_id, k_recs=k_recs)
-    recs = add_reco_popular(k_recs=k_recs, curr_recs=recs)
+    if recs is None:
+        recs = add_reco_popular(
+            k_recs=k_recs, curr_recs=[], user_id=user_id,
+        )
+    elif reco_cache is not None:
+        await reco_cache.set_async(
+            model_name, user_id, k_recs, recs, generation,
+        )
 
     return RecoResponse(user_id=user_id, items=recs)
 
 
+@router.post(
+    path="/reco/{model_name}/batch",
+    tags=["Recommendations"],
+)
+async def get_reco_batch(
+    request: Request,
+    model_name: str,
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token),
+) -> StreamingResponse:
+    """Recommendations for many users in one request.
+
+     The body is either JSON ``{"user_ids": [...]}`` or an NDJSON stream
+     of user ids (content type ``application/x-ndjson``), read whole
+     before scoring starts. The response is NDJSON, one
+     ``{"user_id": ..., "items": [...]}`` line per user, streamed as
+     chunks of users are scored.
+    """
+    app_logger.info(f"Batch request for model: {model_name}")
+
+    if model_name not in model_registry:
+        capture_message(f"Model name '{model_name}' not found")
+        raise ModelNotFoundError(
+            error_message=f"Model name '{model_name}' not found"
+        )
+
+    await load_pipeline(request.app, model_name)
+
+    # read whole before the response starts: a streaming response
+    # receives disconnect messages concurrently and drops body chunks
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    values: List[Any]
+    if content_type.startswith("application/x-ndjson"):
+        values = ndjson_lines(body)
+    else:
+        values = BatchRecoRequest.parse_raw(body).user_ids
+
+    return StreamingResponse(
+        stream_reco_batch(request, model_name, iterate_user_ids(values)),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get(
     path="/explain/{model_name}/{user_id}/{item_id}",
     tags=["Explanations"],
     response_model=ExplainResponse,
 )
 async def explain(
+    request: Request,
     model_name: str,
     user_id: int,
     item_id: int,
@@ -115,6 +497,7 @@ async def explain(
     as well as a textual explanation of why he might like this content.
 
      Args:
+         request: request to the service
          model_name: The name of the model for which
                      explanations are to be obtained.
          user_id: id of the user for whom explanations are needed.
@@ -144,12 +527,75 @@ async def explain(
         capture_message(f"User {user_id} not found")
         raise UserNotFoundError(error_message=f"User {user_id} not found")
 
-    score, explanation = model_output_explain.explain(
-        model_name, user_id, item_id,
+    score, explanation = await request.app.state.inference_executor.run(
+        explain_item, model_name, user_id, item_id,
+        fallback=model_output_explain.fallback,
     )
 
     return ExplainResponse(score=score, explanation=explanation)
 
 
+@router.post(
+    path="/explain/{model_name}/{user_id}",
+    tags=["Explanations"],
+    response_model=BatchExplainResponse,
+)
+async def explain_batch(
+    request: Request,
+    model_name: str,
+    user_id: int,
+    body: BatchExplainRequest,
+    token: HTTPAuthorizationCredentials = Depends(authorization_by_token),
+) -> BatchExplainResponse:
+    """Explanations of a whole shelf of items for one user in one call,
+    the user's part of the model explanation is computed once.
+
+     Args:
+         request: request to the service
+         model_name: The name of the model for which
+                     explanations are to be obtained.
+         user_id: id of the user for whom explanations are needed.
+         body: ids of the items for which explanations are needed.
+         token: authorization token
+
+     return:
+         BatchExplainResponse with "score" and "explanation"
+         of every item, in the order of item_ids.
+    """
+    app_logger.info(
+        f"Request explanations for model: {model_name}, user_id: {user_id}, "
+        f"{len(body.item_ids)} items"
+    )
+
+    if model_name not in explained_model:
+        capture_message(f"Model name '{model_name}' not found")
+        raise ModelNotFoundError(
+            error_message=f"Model name '{model_name}' not found"
+        )
+
+    if user_id > 10 ** 9:
+        capture_message(f"User {user_id} not found")
+        raise UserNotFoundError(error_message=f"User {user_id} not found")
+
+    explanations = await request.app.state.inference_executor.run(
+        explain_items, model_name, user_id, body.item_ids,
+        fallback=lambda: [
+            model_output_explain.fallback() for _ in body.item_ids
+        ],
+    )
+
+    return BatchExplainResponse(
+        user_id=user_id,
+        explanations=[
+            ItemExplainResponse(
+                item_id=item_id, score=score, explanation=explanation,
+            )
+            for item_id, (score, explanation) in zip(
+                body.item_ids, explanations
+            )
+        ],
+    )
+
+
 def add_views(app: FastAPI) -> None:
     app.include_router(router)
@@ -1,5 +1,16 @@
-from service.casual_inference.explain import ModelOutputExplain
+import typing as tp
 
 __all__ = [
     "ModelOutputExplain",
 ]
+
+
+def __getattr__(name: str) -> tp.Any:
+    # the explainer loads data files on import, so it is imported only
+    # when used and precomputed tables can be read without the data
+    if name == "ModelOutputExplain":
+        from service.casual_inference.explain import (  # pylint: disable=C0415
+            ModelOutputExplain,
+        )
+        return ModelOutputExplain
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
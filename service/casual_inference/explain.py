@@ -1,13 +1,21 @@
 import typing as tp
 
-import dill
 import numpy as np
 import pandas as pd
 import yaml
 from scipy.sparse import coo_matrix, csr_matrix
 
-from service.utils import Columns
-from service.utils.common_artifact import interactions
+from service.casual_inference.precomputed import PrecomputedExplanations
+from service.log import app_logger
+from service.utils import Columns, FeatureTable
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import columnar_path, read_table
+from service.utils.common_artifact import (
+    interactions,
+    items_mapping,
+    users_mapping,
+)
+from service.utils.model_export import load_model
 
 
 class ModelOutputExplain:
@@ -26,28 +34,51 @@ class ModelOutputExplain:
 
         # Load Models
         self.models = dict()
-        for model_name in model_paths:
-            with open(model_paths[model_name], "rb") as file:
-                self.models[model_name] = dill.load(file)
+        for model_name, model_path in model_paths.items():
+            self.models[model_name] = artifact_store.get_or_load(
+                model_path,
+                lambda path=model_path: load_model(path),
+            )
+
+        # Load precomputed explanations
+        self.precomputed_paths = explanation_params.get("precomputed") or {}
+        self.precomputed = dict()
+        for model_name, path in self.precomputed_paths.items():
+            precomputed = artifact_store.get_or_load(
+                columnar_path(path),
+                lambda path=path, model_name=model_name: (
+                    PrecomputedExplanations.load(
+                        path, model_paths[model_name],
+                    )
+                ),
+            )
+            if precomputed is not None:
+                self.precomputed[model_name] = precomputed
+            else:
+                app_logger.warning(
+                    f"Explanations of {model_name} are not built "
+                    f"for the current model, they are explained live"
+                )
 
         # Load Interaction
-        users_inv_mapping = dict(
-            enumerate(interactions[Columns.User].unique())
-        )
-        self.users_mapping = {v: k for k, v in users_inv_mapping.items()}
-        self.items_inv_mapping = dict(
-            enumerate(interactions[Columns.Item].unique())
-        )
-        self.items_mapping = {v: k for k, v in self.items_inv_mapping.items()}
+        self.users_mapping = users_mapping
+        self.items_inv_mapping = items_mapping.external_ids
+        self.items_mapping = items_mapping
 
-        self.interactions_csr = self._create_interaction_csr_matrix(
-            interactions,
+        self.interactions_csr = artifact_store.get_or_load(
+            "interactions_csr",
+            lambda: self._create_interaction_csr_matrix(interactions),
         )
 
         # Load Items feature
-        self.items = pd.read_csv(
-            explanation_params["data"]["items"]["path"]
-        )[explanation_params["data"]["items"]["columns"]]
+        items_data = explanation_params["data"]["items"]
+        self.items = artifact_store.get_or_load(
+            items_data["path"],
+            lambda: FeatureTable(
+                read_table(items_data["path"], items_data["columns"]),
+                Columns.Item,
+            ),
+        )
 
     def _create_interaction_csr_matrix(
         self,
@@ -65,60 +96,80 @@ class ModelOutputExplain:
         interaction_matrix = coo_matrix((
             weights,
             (
-                interactions_df[user_col].map(self.users_mapping.get),
-                interactions_df[item_col].map(self.items_mapping.get)
+                self.users_mapping.to_internal(interactions_df[user_col]),
+                self.items_mapping.to_internal(interactions_df[item_col]),
             )
         ))
 
         return interaction_matrix.tocsr()
 
-    def _als_explain(self, user_id: int, item_id: int) -> tp.Tuple[int, float]:
-        total_score, top_contributions, _ = self.models["als"].explain(
+    def _als_explain(
+        self,
+        user_id: int,
+        item_id: int,
+        user_items: tp.Optional[csr_matrix] = None,
+        user_weights: tp.Any = None,
+    ) -> tp.Tuple[int, tp.Optional[str], tp.Any]:
+        """
+        ALS score and explanation of the item. ``user_items`` and
+        ``user_weights`` (the user's Cholesky factor returned by the
+        previous call) are reused between items of one user.
+        """
+        if user_items is None:
+            user_items = self.interactions_csr[self.users_mapping[user_id], :]
+
+        total_score, top_contributions, user_weights = self.models[
+            "als"
+        ].explain(
             userid=0,
-            user_items=self.interactions_csr[self.users_mapping[user_id], :],
+            user_items=user_items,
             itemid=self.items_mapping[item_id],
+            user_weights=user_weights,
             N=2,
         )
 
         top_contributions = top_contributions[1]
 
+        title_contributions = None
         if len(top_contributions) > 0:
-            title_contributions = self.items[
-                self.items[Columns.Item] == self.items_inv_mapping[
-                    top_contributions[0]
-                ]
-                ]["title"].iloc[0]
+            title_contributions = self._item_feature(
+                self.items_inv_mapping[top_contributions[0]], "title",
+            )
+
+        if title_contributions is not None:
             explanation = self.text_template[
                               "als"] + f"'{title_contributions}'"
         else:
-            genres_contributions = self.items[
-                self.items[Columns.Item] == self.items_inv_mapping[
-                    top_contributions[0]
-                ]
-                ]["genres"].iloc[0]
-            if genres_contributions != "no_genre":
-                explanation = self.text_template[
-                                  "dummy"] + f"'{genres_contributions}'"
-            else:
-                explanation = None
+            explanation = self._genres_explanation(item_id)
 
-        return int(total_score * 100), explanation
+        return int(total_score * 100), explanation, user_weights
 
-    def _dummy_explain(self, item_id: int) -> tp.Tuple[int, str]:
-        score = np.random.randint(self.min_score, self.max_score + 1)
-        genres = self.items[
-            self.items[Columns.Item] == item_id
-            ]["genres"].iloc[0]
+    def _item_feature(self, item_id: int, column: str) -> tp.Optional[str]:
+        """
+        Feature of the item by id lookup, None for unknown item.
+        """
+        row = self.items.rows([item_id])[0]
+        if row == -1:
+            return None
+        return self.items.columns[column][row]
 
-        if genres != "no_genre":
-            explanation = self.text_template["dummy"] + f"'{genres}'"
-        else:
-            explanation = None
+    def _genres_explanation(self, item_id: int) -> tp.Optional[str]:
+        genres = self._item_feature(item_id, "genres")
+        if genres is None or genres == "no_genre":
+            return None
+        return self.text_template["dummy"] + f"'{genres}'"
 
-        return score, explanation
+    def _dummy_explain(
+        self,
+        item_id: int,
+    ) -> tp.Tuple[tp.Optional[int], tp.Optional[str]]:
+        # no score, a random one is drawn by post-processing
+        return None, self._genres_explanation(item_id)
 
     def _post_processing(self, score, explanation):
-        if not self.honestly and score < self.min_score:
+        if score is None:
+            score = np.random.randint(self.min_score, self.max_score + 1)
+        elif not self.honestly and score < self.min_score:
             score = np.random.randint(self.min_score,
                                       self.max_score + 1)
         elif not self.honestly and score > self.max_score:
@@ -129,6 +180,12 @@ class ModelOutputExplain:
 
         return score, explanation
 
+    def fallback(self) -> tp.Tuple[int, str]:
+        """
+        Explanation without a model, used when inference is not available.
+        """
+        return self._post_processing(self.min_score, None)
+
     def explain(
         self,
         model_name: str,
@@ -136,11 +193,73 @@ class ModelOutputExplain:
         item_id: int,
     ) -> tp.Tuple[int, str]:
 
-        score, explanation = self._dummy_explain(item_id)
-        if user_id in interactions[Columns.User]:
-            if model_name == "als":
-                score, explanation = self._als_explain(user_id, item_id)
+        return self.explain_items(model_name, user_id, [item_id])[0]
 
-        score, explanation = self._post_processing(score, explanation)
+    def explain_items(
+        self,
+        model_name: str,
+        user_id: int,
+        item_ids: tp.Sequence[int],
+    ) -> tp.List[tp.Tuple[int, str]]:
+        """
+        Explanations of several items for one user.
+        """
+        return [
+            self._post_processing(score, explanation)
+            for score, explanation in self.explain_items_raw(
+                model_name, user_id, item_ids,
+            )
+        ]
 
-        return score, explanation
+    def explain_items_raw(
+        self,
+        model_name: str,
+        user_id: int,
+        item_ids: tp.Sequence[int],
+    ) -> tp.List[tp.Tuple[tp.Optional[int], tp.Optional[str]]]:
+        """
+        Scores and explanations before post-processing, which may draw
+        random scores on each call: precomputed ones if they exist,
+        the rest is explained by the model.
+        """
+        if model_name not in self.precomputed:
+            return self.explain_items_live(model_name, user_id, item_ids)
+
+        explanations = self.precomputed[model_name].get(user_id, item_ids)
+        missed = [
+            idx for idx, explanation in enumerate(explanations)
+            if explanation is None
+        ]
+        if missed:
+            live = self.explain_items_live(
+                model_name, user_id, [item_ids[idx] for idx in missed],
+            )
+            for idx, explanation in zip(missed, live):
+                explanations[idx] = explanation
+        return explanations
+
+    def explain_items_live(
+        self,
+        model_name: str,
+        user_id: int,
+        item_ids: tp.Sequence[int],
+    ) -> tp.List[tp.Tuple[tp.Optional[int], tp.Optional[str]]]:
+        """
+        Scores and explanations of several items for one user by the
+        model before post-processing, the user's part of the ALS
+        explanation is computed once.
+        """
+        user_items, user_weights = None, None
+        if user_id in self.users_mapping and model_name == "als":
+            user_items = self.interactions_csr[self.users_mapping[user_id], :]
+
+        explanations = list()
+        for item_id in item_ids:
+            score, explanation = self._dummy_explain(item_id)
+            if user_items is not None and item_id in self.items_mapping:
+                score, explanation, user_weights = self._als_explain(
+                    user_id, item_id, user_items, user_weights,
+                )
+            explanations.append((score, explanation))
+
+        return explanations
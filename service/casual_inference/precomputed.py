@@ -0,0 +1,201 @@
+"""
+Explanations precomputed for offline recommendations.
+
+Pairs of a recommendations table (user_id, item_id) are explained
+offline with the live model and stored in the column store: a keyed
+table ``path`` with user_id, item_id, score and text_id and a table
+``path`` + ``_texts`` with each distinct explanation text once:
+
+    python -m service.casual_inference.precomputed als <reco table csv>
+
+The output path is ``precomputed`` of the model in explanation config.
+The table is used only while the model file it was built from is not
+changed, otherwise explanations are computed live.
+
+Scores and texts are stored before post-processing (score NaN and
+text_id -1 where the model gives none), so random scores are drawn
+on every request as for live explanations.
+"""
+import multiprocessing
+import os
+import sys
+import typing as tp
+
+import numpy as np
+import pandas as pd
+
+from service.utils import Columns, IdMapping
+from service.utils.columnar import (
+    columnar_path,
+    file_stamp,
+    read_columns,
+    read_meta,
+    write_table,
+)
+from service.utils.ragged import RaggedIndex
+
+TEXT_ID = "text_id"
+TEXT = "text"
+# marks tables of scores before post-processing
+SCORES = "raw"
+
+Explanation = tp.Tuple[tp.Optional[int], tp.Optional[str]]
+
+
+def texts_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}_texts{ext}"
+
+
+class PrecomputedExplanations:
+    """
+    Lookup of precomputed explanations: the rows of a user are found
+    by id, the item among them by a scan of a few items.
+    """
+
+    def __init__(self, index: RaggedIndex, texts: np.ndarray):
+        self.index = index
+        self.texts = texts
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        model_path: str,
+    ) -> tp.Optional["PrecomputedExplanations"]:
+        """
+        Explanations stored at ``path``, None if they were not built
+        or were built from another file of the model.
+        """
+        if not os.path.isdir(columnar_path(path)):
+            return None
+        meta = read_meta(columnar_path(path))
+        if not os.path.exists(model_path) or meta.get(
+            "model"
+        ) != file_stamp(model_path) or meta.get("scores") != SCORES:
+            return None
+
+        table = read_columns(path)
+        return cls(
+            RaggedIndex.from_columns(
+                table[Columns.User],
+                {
+                    column: table[column]
+                    for column in (Columns.Item, "score", TEXT_ID)
+                },
+                keys=IdMapping(np.unique(table[Columns.User])),
+            ),
+            read_columns(texts_path(path), [TEXT])[TEXT],
+        )
+
+    def get(
+        self,
+        user_id: int,
+        item_ids: tp.Sequence[int],
+    ) -> tp.List[tp.Optional[Explanation]]:
+        """
+        Score and explanation of every item before post-processing,
+        None where not precomputed.
+        """
+        row = self.index.row(user_id)
+        explanations: tp.List[tp.Optional[Explanation]] = list()
+        for item_id in item_ids:
+            found = np.flatnonzero(row[Columns.Item] == item_id)
+            if len(found) == 0:
+                explanations.append(None)
+                continue
+            score = row["score"][found[0]]
+            text_id = row[TEXT_ID][found[0]]
+            explanations.append((
+                None if np.isnan(score) else int(score),
+                None if text_id == -1 else str(self.texts[text_id]),
+            ))
+        return explanations
+
+
+# set before the pool is forked, so workers use the loaded explainer
+explainer: tp.Any = None
+
+
+def _explain_chunk(
+    task: tp.Tuple[str, tp.List[tp.Tuple[int, np.ndarray]]],
+) -> pd.DataFrame:
+    model_name, users = task
+    user_ids, item_ids, scores, texts = list(), list(), list(), list()
+    for user_id, user_items in users:
+        explanations = explainer.explain_items_live(
+            model_name, user_id, user_items.tolist(),
+        )
+        user_ids.extend([user_id] * len(user_items))
+        item_ids.extend(user_items.tolist())
+        for score, text in explanations:
+            scores.append(np.nan if score is None else score)
+            texts.append(text)
+
+    return pd.DataFrame({
+        Columns.User: np.array(user_ids, dtype=np.int64),
+        Columns.Item: np.array(item_ids, dtype=np.int64),
+        "score": np.array(scores, dtype=np.float32),
+        TEXT: pd.Series(texts, dtype=object),
+    })
+
+
+def build(
+    model_name: str,
+    reco_path: str,
+    output_path: str,
+    model_path: str,
+    workers: int = os.cpu_count() or 1,
+    chunk_size: int = 1000,
+) -> None:
+    reco = read_columns(reco_path, Columns.UserItem)
+    index = RaggedIndex.from_columns(
+        reco[Columns.User],
+        {Columns.Item: reco[Columns.Item]},
+        keys=IdMapping(np.unique(reco[Columns.User])),
+    )
+    users = [
+        (int(user_id), index.get(user_id, Columns.Item))
+        for user_id in index.keys.external_ids
+    ]
+    tasks = [
+        (model_name, users[start:start + chunk_size])
+        for start in range(0, len(users), chunk_size)
+    ]
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers) as pool:
+        parts = pool.map(_explain_chunk, tasks)
+    table = pd.concat(
+        [_explain_chunk((model_name, []))] + parts, ignore_index=True,
+    )
+
+    # texts missing from the model get text_id -1
+    table[TEXT_ID], texts = pd.factorize(table.pop(TEXT))
+    table[TEXT_ID] = table[TEXT_ID].astype(np.int32)
+
+    # the stamped table is written last, so it marks a complete build
+    write_table(
+        pd.DataFrame({TEXT: np.asarray(texts, dtype=str)}),
+        columnar_path(texts_path(output_path)),
+    )
+    write_table(
+        table, columnar_path(output_path),
+        extra_meta={"model": file_stamp(model_path), "scores": SCORES},
+    )
+
+
+if __name__ == "__main__":
+    # explain imports this module, so it is imported here
+    from service.casual_inference.explain import ModelOutputExplain
+    from service.utils.common_artifact import explained_model
+
+    name = sys.argv[1]
+    explainer = ModelOutputExplain(explained_model)
+    build(
+        name,
+        sys.argv[2],
+        explainer.precomputed_paths[name],
+        explained_model[name],
+    )
+    print(f"Explanations saved to {explainer.precomputed_paths[name]}")
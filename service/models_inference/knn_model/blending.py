@@ -0,0 +1,69 @@
+import typing as tp
+
+import numpy as np
+
+
+class IdfBlender:
+    """
+    Blends recommendations of several models.
+
+    An item scores the sum of weights of the models that recommend it,
+    items with equal score are ordered by their position in ``item_idf``.
+    With the default zero weights the order is the idf order only,
+    items recommended by several models are promoted only with positive
+    weights. Items missing from ``item_idf`` are dropped. Ranks are
+    looked up in an array indexed by item id, so the cost depends on
+    the number of candidates only, not on the catalogue size.
+    """
+
+    def __init__(
+        self,
+        item_idf: np.ndarray,
+        weights: tp.Sequence[float] = (0.0, 0.0),
+    ):
+        item_idf = np.asarray(item_idf, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.n_ranks = len(item_idf)
+
+        self.idf_rank = np.full(item_idf.max(initial=-1) + 1, -1,
+                                dtype=np.int32)
+        self.idf_rank[item_idf[::-1]] = np.arange(
+            len(item_idf) - 1, -1, -1, dtype=np.int32,
+        )
+
+    def _rank(self, items: np.ndarray) -> np.ndarray:
+        rank = np.full(len(items), -1, dtype=np.int32)
+        in_range = (items >= 0) & (items < len(self.idf_rank))
+        rank[in_range] = self.idf_rank[items[in_range]]
+        return rank
+
+    def blend(
+        self,
+        recs: tp.Sequence[tp.Sequence[int]],
+        k_recs: int,
+    ) -> np.ndarray:
+        """
+        Top ``k_recs`` items of the union of ``recs``, one list per model.
+        """
+        items = np.concatenate(
+            [np.asarray(model_recs, dtype=np.int64) for model_recs in recs]
+        )
+        item_weights = np.repeat(
+            self.weights, [len(model_recs) for model_recs in recs]
+        )
+
+        items, inverse = np.unique(items, return_inverse=True)
+        scores = np.bincount(inverse, weights=item_weights,
+                             minlength=len(items))
+
+        rank = self._rank(items)
+        known = rank != -1
+        items, scores, rank = items[known], scores[known], rank[known]
+
+        # a higher score wins, the idf rank breaks ties
+        _, level = np.unique(-scores, return_inverse=True)
+        key = level.astype(np.int64) * self.n_ranks + rank
+        if len(key) > k_recs:
+            top = np.argpartition(key, k_recs - 1)[:k_recs]
+            items, key = items[top], key[top]
+        return items[np.argsort(key, kind="stable")]
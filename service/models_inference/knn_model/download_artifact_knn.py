@@ -1,17 +1,29 @@
 import typing as tp
 
-import dill
 import numpy as np
-import pandas as pd
 import yaml
 
+from service.log import app_logger
+from service.models_inference.knn_model.blending import IdfBlender
+from service.models_inference.knn_model.neighbours import (
+    load_table,
+    neighbours_path,
+)
+from service.utils import Columns, IdMapping
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import read_columns
+from service.utils.common_artifact import get_watched, users_mapping
+from service.utils.model_export import load_model
+from service.utils.ragged import RaggedIndex
+
 
 class DownloadArtifact:
     config_path = './service/configs/inference-knn-model.cfg.yml'
-    path_interactions_data = './data/kion_train/interactions.csv'
     path_item_idf = "./data/kion_train/items_idf.csv"
 
-    def __init__(self):
+    def __init__(self, config_path: str = None):
+        if config_path is not None:
+            self.config_path = config_path
 
         with open(self.config_path) as models_config:
             params = yaml.safe_load(models_config)
@@ -19,32 +31,50 @@ class DownloadArtifact:
         self.run_params = params["run_params"]
 
     def _get_online_reco_artifact(self) -> tp.Dict:
-        interactions = pd.read_csv(self.path_interactions_data)
-        watched = interactions.groupby('user_id').agg(
-            {'item_id': list}
-        ).to_dict()["item_id"]
-        users_inv_mapping = dict(enumerate(interactions['user_id'].unique()))
-        users_mapping = {v: k for k, v in users_inv_mapping.items()}
+        watched = get_watched()
         index_bmp_model = self.run_params["artifact"]["index_bmp_model"]
 
         return {
             "watched": watched,
-            "users_inv_mapping": users_inv_mapping,
             "users_mapping": users_mapping,
             "index_bmp_model": index_bmp_model,
         }
 
     def _get_item_idf(self) -> np.array:
-        return pd.read_csv(self.path_item_idf)["index"].values
+        return artifact_store.get_or_load(
+            "knn_item_idf",
+            lambda: read_columns(self.path_item_idf, ["index"])["index"],
+        )
+
+    def _get_blender(self) -> IdfBlender:
+        weights = self.run_params["artifact"].get("blending_weights") or {}
+        return IdfBlender(
+            self._get_item_idf(),
+            weights=[weights.get("tfidf", 0.0), weights.get("bmp", 0.0)],
+        )
 
     def _get_one_model(self, path_model: str = None):
+        """
+        Precomputed neighbours of the model if they are built for it,
+        otherwise the model itself.
+        """
         if path_model is None:
             path_model = self.run_params["artifact"]["model_path_1"]
 
-        with open(path_model, "rb") as file:
-            model = dill.load(file)
+        if self.run_params["artifact"].get("neighbours_top_n"):
+            neighbours = artifact_store.get_or_load(
+                neighbours_path(path_model),
+                lambda: load_table(path_model),
+            )
+            if neighbours is not None:
+                return neighbours
+            app_logger.warning(
+                f"Neighbours of {path_model} are not built, model is used"
+            )
 
-        return model
+        return artifact_store.get_or_load(
+            path_model, lambda: load_model(path_model),
+        )
 
     def _get_several_model(self, k_model: int = 2) -> tp.List:
         models = list()
@@ -66,12 +96,27 @@ class DownloadArtifact:
         return self.run_params["artifact"]["blending"]
 
     def get_offline_artifact(self):
+        offline_reco_path = self.run_params["artifact"]["offline_reco_path"]
         return {
-            "offline_reco": pd.read_csv(
-                self.run_params["artifact"]["offline_reco_path"]
+            "offline_reco": artifact_store.get_or_load(
+                offline_reco_path,
+                lambda: self._get_offline_reco_index(offline_reco_path),
             )
         }
 
+    @staticmethod
+    def _get_offline_reco_index(offline_reco_path: str) -> RaggedIndex:
+        """
+        Offline recommendations grouped by user: items of each user are
+        a contiguous slice, users are sorted by id.
+        """
+        offline_reco = read_columns(offline_reco_path, Columns.UserItem)
+        return RaggedIndex.from_columns(
+            offline_reco[Columns.User],
+            {Columns.Item: offline_reco[Columns.Item]},
+            keys=IdMapping(np.unique(offline_reco[Columns.User])),
+        )
+
     def get_online_artifact(self):
         online_artifact = self._get_online_reco_artifact()
         bmp = True if online_artifact[
@@ -81,7 +126,6 @@ class DownloadArtifact:
             "model": self._get_one_model(),
             "watched": online_artifact["watched"],
             "users_mapping": online_artifact["users_mapping"],
-            "users_inv_mapping": online_artifact["users_inv_mapping"],
             "bmp": bmp,
         }
 
@@ -103,8 +147,7 @@ class DownloadArtifact:
         return {
             "model_tfidf": model_tfidf,
             "model_bmp": model_bmp,
-            "item_idf": self._get_item_idf(),
+            "blender": self._get_blender(),
             "watched": online_artifact["watched"],
             "users_mapping": online_artifact["users_mapping"],
-            "users_inv_mapping": online_artifact["users_inv_mapping"],
         }
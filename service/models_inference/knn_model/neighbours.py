@@ -0,0 +1,278 @@
+"""
+Top-N similar users of every user precomputed from the similarity
+matrix of an implicit ``ItemItemRecommender``.
+
+The table is built offline next to each model of a KNN config:
+
+    python -m service.models_inference.knn_model.neighbours <config>
+
+and memory-mapped on startup instead of loading the model. After the
+model is retrained, rows of users whose history changed can be
+recomputed in place from it, given a csv file of their user_id:
+
+    python -m service.models_inference.knn_model.neighbours <config> users.csv
+
+A table is used only if it was built from the model file it lies next to.
+Rows refreshed from the current model file are answered from the table
+and the other rows by the model itself until the table is rebuilt.
+"""
+import os
+import sys
+import typing as tp
+
+import numpy as np
+import yaml
+from scipy import sparse
+
+from service.utils import Columns
+from service.utils.columnar import read_columns
+from service.utils.model_export import load_model
+
+NEIGHBOURS_SUFFIX = ".neighbours"
+META_FILE = "meta.yml"
+REFRESHED_FILE = "refreshed.npy"
+
+
+def neighbours_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + NEIGHBOURS_SUFFIX
+
+
+def _model_stamp(model_path: str) -> tp.Dict[str, int]:
+    stat = os.stat(model_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def top_n_per_row(
+    matrix: sparse.csr_matrix,
+    top_n: int,
+    chunk_size: int = 10000,
+    dtype: tp.Type[np.floating] = np.float32,
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    """
+    Column indices and values of the ``top_n`` largest entries of each
+    row in descending order, short rows are padded with -1 and 0.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    n_rows = matrix.shape[0]
+    indices = np.full((n_rows, top_n), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, top_n), dtype=dtype)
+
+    for start in range(0, n_rows, chunk_size):
+        chunk = matrix[start:start + chunk_size]
+        lengths = np.diff(chunk.indptr)
+        rows = np.repeat(np.arange(chunk.shape[0]), lengths)
+
+        order = np.lexsort((-chunk.data, rows))
+        rank = np.arange(len(order)) - np.repeat(chunk.indptr[:-1], lengths)
+        keep = rank < top_n
+
+        rows, rank, order = rows[keep], rank[keep], order[keep]
+        indices[start + rows, rank] = chunk.indices[order]
+        scores[start + rows, rank] = chunk.data[order]
+
+    return indices, scores
+
+
+def select_neighbours(
+    user_row: int,
+    rows: np.ndarray,
+    scores: np.ndarray,
+    bmp: bool,
+) -> np.ndarray:
+    """
+    Similar users of ``user_row`` from ``similar_items`` output.
+    Drops the padding of short rows of a batched call (row -1), and the
+    user itself (for bm25) or users with the same history (score 1 for
+    tfidf).
+    """
+    rows = np.asarray(rows)
+    keep = rows >= 0
+    if bmp:
+        keep &= rows != user_row
+    else:
+        keep &= np.asarray(scores) < 1
+    return rows[keep]
+
+
+class NeighbourTable:
+    """
+    Precomputed neighbours with the ``similar_items`` interface
+    of the implicit model they were built from.
+
+    If only the rows marked in ``current`` are built from the current
+    model, the other rows are answered by the ``model`` itself.
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        current: tp.Optional[np.ndarray] = None,
+        model: tp.Any = None,
+    ):
+        self.indices = indices
+        self.scores = scores
+        self.current = current
+        self.model = model
+
+    def _row(self, itemid: int, N: int) -> tp.Tuple[np.ndarray, np.ndarray]:
+        if self.current is not None and not self.current[itemid]:
+            return self.model.similar_items(itemid, N=N)
+
+        indices = self.indices[itemid, :N]
+        valid = indices != -1
+        return indices[valid], self.scores[itemid, :N][valid]
+
+    def similar_items(
+        self,
+        itemid: tp.Union[int, np.ndarray],
+        N: int = 10,  # pylint: disable=invalid-name
+    ):
+        """
+        Neighbours of one user, or lists of neighbours of several users.
+        """
+        if np.isscalar(itemid):
+            return self._row(itemid, N)
+
+        rows = [self._row(row, N) for row in itemid]
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def _read_meta(path: str) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as file:
+        return yaml.safe_load(file)
+
+
+def _save_meta(path: str, meta: tp.Dict[str, tp.Any]) -> None:
+    with open(os.path.join(path, META_FILE), "w") as file:
+        yaml.safe_dump(meta, file)
+
+
+def save_table(
+    model_path: str,
+    indices: np.ndarray,
+    scores: np.ndarray,
+) -> None:
+    path = neighbours_path(model_path)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "indices.npy"), indices)
+    np.save(os.path.join(path, "scores.npy"), scores)
+    _save_meta(path, {"model": _model_stamp(model_path)})
+
+
+def load_table(
+    model_path: str,
+    load_fallback: tp.Callable[[str], tp.Any] = load_model,
+) -> tp.Optional[NeighbourTable]:
+    """
+    Memory-mapped table of the model, None if it is missing or was
+    built from another model file. If only some rows were refreshed
+    from the model file, the model from ``load_fallback`` answers
+    the others.
+    """
+    path = neighbours_path(model_path)
+    meta = _read_meta(path)
+    if meta is None:
+        return None
+
+    stamp = _model_stamp(model_path)
+    if stamp not in (meta.get("model"), meta.get("refreshed")):
+        return None
+
+    table = NeighbourTable(
+        np.load(os.path.join(path, "indices.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "scores.npy"), mmap_mode="r"),
+    )
+    if meta.get("model") != stamp:
+        table.current = np.load(os.path.join(path, REFRESHED_FILE))
+        table.model = load_fallback(model_path)
+    return table
+
+
+def refresh_rows(
+    model_path: str,
+    similarity: sparse.csr_matrix,
+    rows: np.ndarray,
+) -> bool:
+    """
+    Recompute rows of the table in place from the retrained model
+    and mark them as built from it; the table is marked as built from
+    the model once all its rows are. False if the table is missing
+    or the number of users changed, then the table must be rebuilt.
+    """
+    path = neighbours_path(model_path)
+    meta = _read_meta(path)
+    if meta is None:
+        return False
+
+    indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="r+")
+    scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r+")
+    if indices.shape[0] != similarity.shape[0]:
+        return False
+
+    stamp = _model_stamp(model_path)
+    if meta.get("model") == stamp:
+        current = np.ones(indices.shape[0], dtype=bool)
+    elif meta.get("refreshed") == stamp:
+        current = np.load(os.path.join(path, REFRESHED_FILE))
+    else:
+        current = np.zeros(indices.shape[0], dtype=bool)
+
+    rows = np.asarray(rows)
+    indices[rows], scores[rows] = top_n_per_row(
+        sparse.csr_matrix(similarity)[rows], indices.shape[1],
+    )
+    indices.flush()
+    scores.flush()
+
+    current[rows] = True
+    if current.all():
+        meta = {"model": stamp}
+    else:
+        np.save(os.path.join(path, REFRESHED_FILE), current)
+        meta["refreshed"] = stamp
+    _save_meta(path, meta)
+    return True
+
+
+def _config_models(artifact: tp.Dict[str, tp.Any]) -> tp.List[str]:
+    k_model = 2 if artifact["blending"] else 1
+    return [artifact[f"model_path_{idx}"] for idx in range(1, k_model + 1)]
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as models_config:
+        artifact_params = yaml.safe_load(models_config)["run_params"][
+            "artifact"
+        ]
+
+    users = None
+    if len(sys.argv) > 2:
+        # loads interactions, so imported only when refreshing rows
+        from service.utils.common_artifact import users_mapping
+
+        users = users_mapping.to_internal(
+            read_columns(sys.argv[2], [Columns.User])[Columns.User]
+        )
+        users = users[users != -1]
+
+    for path_model in _config_models(artifact_params):
+        model = load_model(path_model)
+
+        if users is not None and refresh_rows(
+            path_model, model.similarity, users
+        ):
+            print(f"{len(users)} rows refreshed in "
+                  f"{neighbours_path(path_model)}")
+            continue
+
+        save_table(
+            path_model,
+            *top_n_per_row(
+                model.similarity, artifact_params["neighbours_top_n"]
+            ),
+        )
+        print(f"Neighbours saved to {neighbours_path(path_model)}")
@@ -2,19 +2,20 @@ import typing as tp
 
 import implicit
 import numpy as np
-import pandas as pd
 
 from service.models_inference.knn_model.download_artifact_knn import (
     DownloadArtifact,
 )
-from service.utils import Columns
+from service.models_inference.knn_model.neighbours import select_neighbours
+from service.utils import Columns, IdMapping
+from service.utils.ragged import unique_first_seen
 
 
 class RecommendUserKNN:
 
-    def __init__(self):
+    def __init__(self, config_path: str = None):
 
-        loader = DownloadArtifact()
+        loader = DownloadArtifact(config_path)
 
         self.type_reco = loader.get_type_reco()
 
@@ -35,27 +36,16 @@ class RecommendUserKNN:
         user: int,
         k_recs: int,
         model: implicit,
-        users_mapping: tp.Dict[int, int],
-        users_inv_mapping: tp.Dict[int, int],
+        users_mapping: IdMapping,
         bmp: bool,
-    ) -> pd.DataFrame:
+    ) -> np.ndarray:
         """
-            The function find similar users.
+            The function finds similar users as internal rows.
         """
         user_id = users_mapping[user]
         recs, scores = model.similar_items(user_id, N=k_recs)
 
-        if bmp:
-            recs = list(
-                filter(lambda x: x != users_inv_mapping[user_id], recs))
-
-        else:
-            start_idx = abs(
-                len(list(filter(lambda x: x < 1, scores))) - len(scores)
-            )
-            recs = recs[start_idx:]
-
-        return [users_inv_mapping[int(user)] for user in recs]
+        return select_neighbours(user_id, recs, scores, bmp)
 
     def _get_offline_reco(
         self,
@@ -67,16 +57,7 @@ class RecommendUserKNN:
         """
         offline_reco = self.artifact["offline_reco"]
 
-        recs = list()
-        if user_id in offline_reco[Columns.User]:
-            recs = offline_reco[
-                offline_reco[Columns.User] == user_id
-                ][Columns.Item].tolist()
-
-            if len(recs) > k_recs:
-                recs = recs[:k_recs]
-
-        return recs
+        return offline_reco.get(user_id, Columns.Item)[:k_recs].tolist()
 
     def _get_online_reco(
         self,
@@ -96,21 +77,19 @@ class RecommendUserKNN:
             if model is None:
                 model = self.artifact["model"]
 
-            sim_user_id = self._get_sim_user(
+            sim_user_rows = self._get_sim_user(
                 user_id,
                 k_recs,
                 model=model,
                 users_mapping=self.artifact["users_mapping"],
-                users_inv_mapping=self.artifact["users_inv_mapping"],
                 bmp=bmp
             )
 
-            recs = np.array(
-                [item for user in sim_user_id for item in
-                 self.artifact["watched"][user]]
-            )
-            recs = recs[
-                np.sort(np.unique(recs, return_index=True)[1])].tolist()
+            recs = unique_first_seen(
+                self.artifact["watched"].gather_rows(
+                    sim_user_rows, Columns.Item,
+                )
+            ).tolist()
 
             if (len(recs) > k_recs) and (not blending):
                 recs = recs[:k_recs]
@@ -124,7 +103,7 @@ class RecommendUserKNN:
     ) -> tp.List[int]:
         """
             The function creates online recommendation
-            with blending by tfidf algorithm.
+            with blending of tfidf and bm25 models.
         """
         recs = list()
         if user_id in self.artifact["users_mapping"]:
@@ -140,26 +119,89 @@ class RecommendUserKNN:
             recs_bmp = self._get_online_reco(
                 user_id=user_id,
                 k_recs=k_recs,
-                model=self.artifact["model_tfidf"],
+                model=self.artifact["model_bmp"],
                 bmp=True,
                 blending=True,
             )
 
-            recs = np.unique(
-                np.concatenate(
-                    (recs_tfidf, recs_bmp)
-                )
-            )
+            recs = self.artifact["blender"].blend(
+                (recs_tfidf, recs_bmp), k_recs,
+            ).tolist()
 
-            item_idf = self.artifact["item_idf"]
-            mask = np.in1d(item_idf, recs)
-            recs = item_idf[mask].tolist()
+        return recs
 
-            if len(recs) > k_recs:
-                recs = recs[:k_recs]
+    def _get_offline_reco_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+    ) -> tp.List[tp.List[int]]:
+        """
+            The function creates offline recommendations for several users.
+        """
+        offline_reco = self.artifact["offline_reco"]
+        rows = offline_reco.keys.to_internal(user_ids)
+        items = offline_reco.columns[Columns.Item]
 
+        recs = list()
+        for row in rows:
+            if row == -1:
+                recs.append([])
+                continue
+            start = offline_reco.indptr[row]
+            end = min(offline_reco.indptr[row + 1], start + k_recs)
+            recs.append(items[start:end].tolist())
         return recs
 
+    def _get_online_reco_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+    ) -> tp.List[tp.List[int]]:
+        """
+            The function creates online recommendations for several users
+            with one similar_items call for all known users.
+        """
+        recs: tp.List[tp.List[int]] = [[] for _ in user_ids]
+
+        users_idx = self.artifact["users_mapping"].to_internal(user_ids)
+        known = np.flatnonzero(users_idx != -1)
+        if len(known) == 0:
+            return recs
+
+        batch_recs, batch_scores = self.artifact["model"].similar_items(
+            users_idx[known], N=k_recs,
+        )
+        for position, user_idx, user_recs, user_scores in zip(
+            known, users_idx[known], batch_recs, batch_scores,
+        ):
+            sim_user_rows = select_neighbours(
+                user_idx, user_recs, user_scores, self.artifact["bmp"],
+            )
+            recs[position] = unique_first_seen(
+                self.artifact["watched"].gather_rows(
+                    sim_user_rows, Columns.Item,
+                )
+            )[:k_recs].tolist()
+
+        return recs
+
+    def recommend_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+    ) -> tp.List[tp.List[int]]:
+        if self.type_reco == "offline":
+            return self._get_offline_reco_batch(user_ids, k_recs)
+
+        elif not self.blending:
+            return self._get_online_reco_batch(user_ids, k_recs)
+
+        else:
+            return [
+                self._get_online_blending_reco(user_id, k_recs)
+                for user_id in user_ids
+            ]
+
     def recommend(self, user_id: int, k_recs: int) -> tp.List[int]:
         if self.type_reco == "offline":
             return self._get_offline_reco(user_id, k_recs)
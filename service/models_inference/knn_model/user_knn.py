@@ -1,11 +1,13 @@
 from collections import Counter
-from typing import Dict
+from typing import Tuple
 
 import numpy as np
 import pandas as pd
 import scipy as sp
 from implicit.nearest_neighbours import ItemItemRecommender
 
+from service.models_inference.knn_model.neighbours import top_n_per_row
+
 
 class UserKnn:
     """Class for fit-perdict UserKNN model
@@ -30,6 +32,9 @@ class UserKnn:
         self.items_inv_mapping = dict(enumerate(train['item_id'].unique()))
         self.items_mapping = {v: k for k, v in self.items_inv_mapping.items()}
 
+        self.users_external = train['user_id'].unique()
+        self.items_external = train['item_id'].unique()
+
     def get_matrix(
         self,
         df: pd.DataFrame,
@@ -43,15 +48,15 @@ class UserKnn:
         else:
             weights = np.ones(len(df), dtype=np.float32)
 
-        interaction_matrix = sp.sparse.coo_matrix((
-            weights,
-            (
-                df[user_col].map(self.users_mapping.get),
-                df[item_col].map(self.items_mapping.get)
-            )
-        ))
+        rows = df[user_col].map(self.users_mapping.get).values
+        cols = df[item_col].map(self.items_mapping.get).values
+        interaction_matrix = sp.sparse.coo_matrix((weights, (rows, cols)))
 
-        self.watched = df.groupby(user_col).agg({item_col: list})
+        # every interaction, also those with zero weight
+        self.watched_csr = sp.sparse.csr_matrix(
+            (np.ones(len(df), dtype=np.float32), (rows, cols)),
+            shape=interaction_matrix.shape,
+        )
         return interaction_matrix
 
     def idf(self, n: int, x: float):
@@ -66,6 +71,11 @@ class UserKnn:
         del item_idf['doc_freq']
         self.item_idf = item_idf
 
+        # idf by internal item id
+        self.item_idf_values = item_idf.set_index('index')['idf'].reindex(
+            self.items_external
+        ).values
+
     def fit(self, train: pd.DataFrame):
         self.get_mappings(train)
         self.weights_matrix = self.get_matrix(train)
@@ -77,58 +87,99 @@ class UserKnn:
         self.user_knn.fit(self.weights_matrix)
         self.is_fitted = True
 
-    def _generate_recs_mapper(self, user_mapping: Dict[int, int],
-                              user_inv_mapping: Dict[int, int], N: int):
-        def _recs_mapper(user):
-            user_id = user_mapping[user]
-            recs = self.user_knn.similar_items(user_id, N=N)
-            return (
-                [user_inv_mapping[user] for user, _ in recs],
-                [sim for _, sim in recs]
+    def _neighbours(
+        self,
+        rows: np.ndarray,
+        bmp25: bool,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Positions in ``rows``, ids and similarities of the neighbours:
+        top N_users of the similarity rows without the user itself
+        (first neighbour for bm25, similarity 1 otherwise).
+        """
+        similarity = self.user_knn.similarity
+        neighbours, sims = top_n_per_row(
+            similarity[rows], self.N_users, dtype=similarity.dtype,
+        )
+        valid = neighbours != -1
+        if not bmp25:
+            valid &= sims < 1
+        else:
+            valid[:, 0] = False
+
+        positions = np.nonzero(valid)[0]
+        return positions, neighbours[valid], sims[valid]
+
+    def _predict_chunk(
+        self,
+        rows: np.ndarray,
+        N_recs: int,
+        bmp25: bool,
+    ) -> pd.DataFrame:
+        positions, neighbours, sims = self._neighbours(rows, bmp25)
+
+        # histories of the neighbours through the interaction matrix
+        indptr = self.watched_csr.indptr
+        starts = indptr[neighbours].astype(np.int64)
+        lengths = indptr[neighbours + 1] - starts
+        items = self.watched_csr.indices[
+            np.arange(lengths.sum()) + np.repeat(
+                starts - (np.cumsum(lengths) - lengths), lengths
             )
-        return _recs_mapper
+        ]
+        positions = np.repeat(positions, lengths)
+        sims = np.repeat(sims, lengths)
+
+        # an item watched by several neighbours keeps the max similarity
+        order = np.lexsort((-sims, items, positions))
+        positions, items, sims = positions[order], items[order], sims[order]
+        first = np.ones(len(items), dtype=bool)
+        first[1:] = (positions[1:] != positions[:-1]) \
+            | (items[1:] != items[:-1])
+        positions, items, scores = positions[first], items[first], sims[first]
+
+        if self.use_weight_idf:
+            scores = scores * self.item_idf_values[items]
+
+        order = np.lexsort((-scores, positions))
+        positions, items, scores = (
+            positions[order], items[order], scores[order]
+        )
+        group_starts = np.flatnonzero(
+            np.r_[True, positions[1:] != positions[:-1]]
+        )
+        ranks = np.arange(len(positions)) - np.repeat(
+            group_starts, np.diff(np.r_[group_starts, len(positions)])
+        ) + 1
+        top = ranks <= N_recs
+
+        return pd.DataFrame({
+            'user_id': self.users_external[rows[positions[top]]],
+            'item_id': self.items_external[items[top]],
+            'score': scores[top],
+            'rank': ranks[top],
+        })
 
     def predict(
         self,
         test: pd.DataFrame,
         N_recs: int = 10,
-        bmp25: bool = False
+        bmp25: bool = False,
+        chunk_size: int = 10000,
     ):
-
+        """
+        Top N_recs items of every test user known to the model,
+        computed for chunks of chunk_size users to bound memory.
+        """
         if not self.is_fitted:
             raise ValueError("Please call fit before predict")
 
-        mapper = self._generate_recs_mapper(
-            user_mapping=self.users_mapping,
-            user_inv_mapping=self.users_inv_mapping,
-            N=self.N_users
-        )
-
-        recs = pd.DataFrame({'user_id': test['user_id'].unique()})
-        recs['sim_user_id'], recs['sim'] = zip(*recs['user_id'].map(mapper))
-        recs = recs.set_index('user_id').apply(pd.Series.explode).reset_index()
-
-        if not bmp25:
-            recs = recs[~(recs['sim'] >= 1)]
-        else:
-            recs['rank'] = recs.groupby('user_id').cumcount()
-            recs = recs[recs['rank'] != 0]
-            del recs['rank']
-
-        recs = recs.merge(self.watched, left_on=['sim_user_id'],
-                          right_on=['user_id'], how='left') \
-            .explode('item_id') \
-            .sort_values(['user_id', 'sim'], ascending=False) \
-            .drop_duplicates(['user_id', 'item_id'], keep='first')
-
-        if self.use_weight_idf:
-            recs = recs.merge(self.item_idf, left_on='item_id',
-                              right_on='index', how='left')
-            recs['score'] = recs['sim'] * recs['idf']
-            recs = recs.sort_values(['user_id', 'score'], ascending=False)
-        else:
-            recs.rename(columns={'sim': 'score'}, inplace=True)
+        users = pd.Series(test['user_id'].unique())
+        rows = users.map(self.users_mapping).dropna().values.astype(np.int64)
 
-        recs['rank'] = recs.groupby('user_id').cumcount() + 1
-        return recs[recs['rank'] <= N_recs][
-            ['user_id', 'item_id', 'score', 'rank']]
+        recs = pd.concat([
+            self._predict_chunk(rows[start:start + chunk_size], N_recs, bmp25)
+            for start in range(0, max(len(rows), 1), chunk_size)
+        ], ignore_index=True)
+        return recs.sort_values(['user_id', 'rank'],
+                                ascending=[False, True], ignore_index=True)
@@ -0,0 +1,81 @@
+import typing as tp
+
+import numpy as np
+
+from service.utils import Columns
+from service.utils.ragged import RaggedIndex
+
+
+class PopularFiller:
+    """
+    Completes recommendations with popular items up to ``k_recs``.
+
+    Recommended items keep their order without repeats, popular items
+    follow in popularity order: the user's cohort list first, then the
+    global one. Items already recommended are skipped, watched items
+    too while the popular lists have enough other items.
+    """
+
+    def __init__(
+        self,
+        popular: np.ndarray,
+        watched: tp.Optional[RaggedIndex] = None,
+        cohort_popular: tp.Optional[RaggedIndex] = None,
+        user_cohorts: tp.Optional[RaggedIndex] = None,
+    ):
+        self.popular = np.asarray(popular)
+        self.watched = watched
+        self.cohort_popular = cohort_popular
+        self.user_cohorts = user_cohorts
+
+    def _sources(self, user_id: tp.Optional[int]) -> tp.List[np.ndarray]:
+        sources = [self.popular]
+        if self.user_cohorts is not None and user_id is not None:
+            cohort = self.user_cohorts.get(user_id, "cohort")
+            if len(cohort):
+                sources.insert(
+                    0, self.cohort_popular.get(cohort[0], Columns.Item)
+                )
+        return sources
+
+    @staticmethod
+    def _take(
+        source: np.ndarray,
+        n_items: int,
+        exclude: np.ndarray,
+    ) -> np.ndarray:
+        """
+        First ``n_items`` of ``source`` not in ``exclude``: at most
+        ``len(exclude)`` items are skipped, so a prefix is enough.
+        """
+        prefix = source[:n_items + len(exclude)]
+        return prefix[~np.isin(prefix, exclude)][:n_items]
+
+    def fill(
+        self,
+        k_recs: int,
+        curr_recs: tp.Sequence[int],
+        user_id: tp.Optional[int] = None,
+    ) -> tp.List[int]:
+        # repeated items of the model keep their first position
+        recs = list(dict.fromkeys(curr_recs))[:k_recs]
+        if len(recs) == k_recs:
+            return recs
+
+        watched = np.array([], dtype=np.int64)
+        if self.watched is not None and user_id is not None:
+            watched = self.watched.get(user_id, Columns.Item)
+
+        sources = self._sources(user_id)
+        # the second pass allows watched items if the first is short
+        for skip_watched in (True, False):
+            for source in sources:
+                exclude = np.asarray(recs, dtype=np.int64)
+                if skip_watched:
+                    exclude = np.concatenate((exclude, watched))
+                recs.extend(
+                    self._take(source, k_recs - len(recs), exclude).tolist()
+                )
+                if len(recs) == k_recs:
+                    return recs
+        return recs
@@ -1,21 +1,60 @@
 import typing as tp
 
-from service.utils.common_artifact import popular_items
+import numpy as np
+
+from service.models_inference.popular.filler import PopularFiller
+from service.utils import Columns, IdMapping
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import read_columns
+from service.utils.common_artifact import data, get_watched, popular_items
+from service.utils.ragged import RaggedIndex
+
+
+def _load_index(path: str, key_column: str) -> RaggedIndex:
+    table = read_columns(path)
+    return RaggedIndex.from_columns(
+        table[key_column],
+        {column: values for column, values in table.items()
+         if column != key_column},
+        keys=IdMapping(np.unique(table[key_column])),
+    )
+
+
+def get_popular_filler(config: tp.Dict[str, tp.Any]) -> PopularFiller:
+    watched = None
+    if config.get("popular_exclude_watched"):
+        watched = get_watched()
+
+    cohort_popular, user_cohorts = None, None
+    cohorts = config.get("popular_cohorts")
+    if cohorts:
+        cohort_popular = artifact_store.get_or_load(
+            cohorts["items"],
+            lambda: _load_index(cohorts["items"], "cohort"),
+        )
+        user_cohorts = artifact_store.get_or_load(
+            cohorts["users"],
+            lambda: _load_index(cohorts["users"], Columns.User),
+        )
+
+    return PopularFiller(
+        np.asarray(popular_items),
+        watched=watched,
+        cohort_popular=cohort_popular,
+        user_cohorts=user_cohorts,
+    )
+
+
+popular_filler = get_popular_filler(data)
 
 
 def add_reco_popular(
     k_recs: int,
     curr_recs: tp.List[int],
+    user_id: tp.Optional[int] = None,
 ) -> tp.List[int]:
     """
         The function adds popular to the recommendations,
         if this is not enough.
     """
-    if len(curr_recs) < k_recs:
-        curr_recs = set(curr_recs)
-        for item_pop in popular_items:
-            curr_recs.add(item_pop)
-            if len(curr_recs) == k_recs:
-                return list(curr_recs)
-    else:
-        return curr_recs
+    return popular_filler.fill(k_recs, curr_recs, user_id)
@@ -1,67 +1,139 @@
-import dill
+import typing as tp
+
 import numpy as np
 import pandas as pd
 import yaml
 
+from service.utils import Columns, FeatureTable
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import read_table
+from service.utils.model_export import load_model
+
 
 class RankerModel:
     path_config_run = "./service/configs/inference-ranker.cfg.yml"
 
-    def __init__(self):
+    def __init__(self, path_config_run: str = None):
         """
         Download model artifacts.
         """
+        if path_config_run is not None:
+            self.path_config_run = path_config_run
+
         with open(self.path_config_run) as models_config:
             params = yaml.safe_load(models_config)["pointwise"]
 
-        with open(params["model_path"], "rb") as file:
-            self.model = dill.load(file)
+        self.model = artifact_store.get_or_load(
+            params["model_path"],
+            lambda: load_model(params["model_path"]),
+        )
 
-        self.users_features = pd.read_csv(
-            params["data_user"]["path_users_features"])
-        self.items_features = pd.read_csv(
-            params["data_user"]["path_items_features"])
+        data_user = params["data_user"]
+        self.users_features = artifact_store.get_or_load(
+            data_user["path_users_features"],
+            lambda: FeatureTable(
+                read_table(data_user["path_users_features"]), Columns.User,
+            ),
+        )
+        self.items_features = artifact_store.get_or_load(
+            data_user["path_items_features"],
+            lambda: FeatureTable(
+                read_table(data_user["path_items_features"]), Columns.Item,
+            ),
+        )
 
         self.column_features = params["data_user"]["columns"]
-        self.users_columns = self.users_features.columns
+
+    def _get_features(
+        self,
+        user_rows: np.ndarray,
+        item_rows: np.ndarray,
+        candidates: tp.Mapping[str, tp.Any],
+        known: np.ndarray,
+    ) -> pd.DataFrame:
+        """
+        Ranker features as typed columns, one row per known candidate.
+        """
+        data = dict()
+        for column in self.column_features:
+            if column in self.users_features.columns:
+                data[column] = self.users_features.take(column, user_rows)
+            elif column in self.items_features.columns:
+                data[column] = self.items_features.columns[column][item_rows]
+            else:
+                data[column] = np.asarray(candidates[column])[known]
+
+        return pd.DataFrame(data, copy=False)
 
     def recommend(self,
                   user_id: int,
                   k_recs: int,
-                  candidates: pd.DataFrame):
+                  candidates: tp.Mapping[str, tp.Any]):
+        """
+        candidates: item_id, lfm_score and rank of candidate items,
+                    a dataframe or a dict of arrays
+        """
+        item_ids = np.asarray(candidates[Columns.Item]).astype(np.int64)
+        item_rows = self.items_features.rows(item_ids)
+        known = item_rows != -1
+        item_ids, item_rows = item_ids[known], item_rows[known]
 
-        users_features = pd.DataFrame(
-            np.repeat(
-                self.users_features[
-                    self.users_features["user_id"] == user_id
-                    ].values, len(candidates), axis=0
-            )
-        )
-        users_features.columns = self.users_columns
-
-        candidates_features = pd.merge(self.items_features,
-                                       candidates,
-                                       on="item_id",
-                                       how="inner")
-
-        data = pd.concat(
-            [
-                users_features,
-                candidates_features,
-            ],
-            axis=1
-        )[self.column_features]
-        data["genres"] = data["genres"].astype(str)
-        data["countries"] = data["countries"].astype(str)
+        if len(item_ids) == 0:
+            return []
+
+        user_rows = np.repeat(self.users_features.rows([user_id]),
+                              len(item_rows))
+        data = self._get_features(user_rows, item_rows, candidates, known)
 
         ranker_score = self.model.predict_proba(data)[:, 1]
         ranker_score = np.argsort(ranker_score)[::-1]
 
-        recs = list(
-            candidates_features["item_id"].values[ranker_score]
-        )
+        return item_ids[ranker_score[:k_recs]].tolist()
 
-        if len(recs) > k_recs:
-            recs = recs[:k_recs]
+    def recommend_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+        candidates: tp.List[tp.Mapping[str, tp.Any]],
+    ) -> tp.List[tp.List[int]]:
+        """
+        Rank candidates of several users with one predict_proba call.
+        """
+        if not candidates:
+            return []
 
+        columns = {
+            column: np.concatenate([
+                np.asarray(user_candidates[column])
+                for user_candidates in candidates
+            ])
+            for column in candidates[0]
+        }
+        lengths = np.array([
+            len(user_candidates[Columns.Item])
+            for user_candidates in candidates
+        ], dtype=np.int64)
+        user_rows = np.repeat(self.users_features.rows(user_ids), lengths)
+
+        item_ids = columns[Columns.Item].astype(np.int64)
+        item_rows = self.items_features.rows(item_ids)
+        known = item_rows != -1
+        if not known.any():
+            return [[] for _ in user_ids]
+
+        ranker_score = np.full(len(item_ids), -np.inf)
+        ranker_score[known] = self.model.predict_proba(
+            self._get_features(
+                user_rows[known], item_rows[known], columns, known,
+            )
+        )[:, 1]
+
+        recs = list()
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            user_known = known[start:end]
+            order = np.argsort(ranker_score[start:end][user_known])[::-1]
+            recs.append(
+                item_ids[start:end][user_known][order[:k_recs]].tolist()
+            )
         return recs
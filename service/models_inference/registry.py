@@ -0,0 +1,69 @@
+import threading
+import typing as tp
+
+import yaml
+
+from service.log import app_logger
+from service.models_inference.run_reco_pipeline import MainPipeline
+
+
+class ModelRegistry:
+    """
+    Maps each registered model name to its own pipeline.
+
+    A pipeline and its artifacts are loaded on the first request for
+    the model or when the model is warmed, so models that are never
+    requested do not take memory. Models warmed on import are loaded in
+    the preloaded gunicorn master and shared by the workers, models
+    loaded lazily are private to each worker that requests them.
+    """
+
+    path_pipeline = "./service/configs/pipeline.cfg.yml"
+
+    def __init__(self, path_pipeline: str = None):
+        if path_pipeline is not None:
+            self.path_pipeline = path_pipeline
+
+        with open(self.path_pipeline) as models_config:
+            pipeline_params = yaml.safe_load(models_config)
+
+        self.models_params = pipeline_params["models"]
+        self.pipelines: tp.Dict[str, MainPipeline] = dict()
+        self._lock = threading.Lock()
+
+        self.warm(pipeline_params.get("warmup") or [])
+
+    def __contains__(self, model_name: str) -> bool:
+        return model_name in self.models_params
+
+    def __iter__(self) -> tp.Iterator[str]:
+        return iter(self.models_params)
+
+    def micro_batching(self, model_name: str) -> bool:
+        """
+        Whether concurrent requests to the model are served in batches.
+        """
+        return bool(self.models_params[model_name].get("micro_batching"))
+
+    def loaded(self, model_name: str) -> bool:
+        return model_name in self.pipelines
+
+    def get(self, model_name: str) -> MainPipeline:
+        """
+        Pipeline of the model, constructed on first access.
+        """
+        pipeline = self.pipelines.get(model_name)
+        if pipeline is not None:
+            return pipeline
+
+        with self._lock:
+            if model_name not in self.pipelines:
+                app_logger.info(f"Loading pipeline for model {model_name}")
+                self.pipelines[model_name] = MainPipeline(
+                    self.models_params[model_name]
+                )
+            return self.pipelines[model_name]
+
+    def warm(self, model_names: tp.Iterable[str]) -> None:
+        for model_name in model_names:
+            self.get(model_name)
@@ -1,14 +1,27 @@
 import typing as tp
 
-import pandas as pd
-import yaml
+import numpy as np
 
 from service.models_inference.knn_model.reco_knn_model import RecommendUserKNN
 from service.models_inference.ranker_model.reco_ranker_model import RankerModel
 from service.models_inference.vector_model.reco_vector_model import (
     RecommendVectorModel,
 )
-from service.utils import Columns
+from service.utils import Columns, IdMapping, RaggedIndex
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import read_columns
+
+CANDIDATE_COLUMNS = {
+    Columns.Item: np.int64,
+    "lfm_score": np.float32,
+    Columns.Rank: np.int32,
+}
+
+COMPONENTS = {
+    "knn_model": RecommendUserKNN,
+    "vector_model": RecommendVectorModel,
+    "ranker_pointwise": RankerModel,
+}
 
 
 class MainPipeline:
@@ -16,51 +29,110 @@ class MainPipeline:
     Class for recommend all pipeline recsys
     """
 
-    path_pipeline = "./service/configs/pipeline.cfg.yml"
-
-    def __init__(self):
+    def __init__(self, type_model: tp.Dict[str, tp.Dict]):
         """
-        Download type pipeline
+        Download only the models used by the pipeline
+        type_model: pipeline description, see pipeline.cfg.yml
         """
-        with open(self.path_pipeline) as models_config:
-            pipeline_params = yaml.safe_load(models_config)
-
-        self.type_model = pipeline_params["type_model"]
+        self.type_model = type_model
         self.models = dict()
 
+        if "one_stage" in self.type_model:
+            one_stage = self.type_model["one_stage"]
+            self.models[one_stage["model"]] = COMPONENTS[one_stage["model"]](
+                one_stage.get("config")
+            )
+
+        elif "two_stage" in self.type_model:
+            two_stage = self.type_model["two_stage"]
+            if two_stage.get("candidates_source") == "online":
+                self.models["vector_model"] = RecommendVectorModel(
+                    two_stage.get("vector_config")
+                )
+            else:
+                data_candidate = two_stage["data_candidate"]
+                self.models["candidates"] = artifact_store.get_or_load(
+                    data_candidate,
+                    lambda: self._load_candidates(data_candidate),
+                )
+            self.models[two_stage["model_ranker"]] = COMPONENTS[
+                two_stage["model_ranker"]
+            ](two_stage.get("config"))
+
+    @staticmethod
+    def _explode(values: np.ndarray) -> tp.Tuple[np.ndarray, np.ndarray]:
         """
-        Download knn Models
+        Flatten a column of lists saved as strings "[1, 2, 3]".
+        Returns flat values and length of every list.
         """
-        self.models["knn_model"] = RecommendUserKNN()
-
-        """
-        Download ALS / LightFM Models
-        """
-        self.models["vector_model"] = RecommendVectorModel()
+        lists = [str(value).strip("[] ") for value in values]
+        lengths = np.array(
+            [value.count(",") + 1 if value else 0 for value in lists]
+        )
+        flat = np.array(
+            ",".join(value for value in lists if value).split(",")
+            if lengths.sum() else []
+        )
+        return flat, lengths
 
+    @staticmethod
+    def _load_candidates(data_candidate: str) -> RaggedIndex:
         """
-        Download rankers
+        Candidates as flat typed arrays grouped by user. Columns of lists
+        (one row per user) are exploded once here instead of per request.
         """
-        self.models["candidates"] = pd.read_csv(
-            self.type_model["two_stage"]["data_candidate"]
+        candidates = read_columns(
+            data_candidate, [Columns.User] + list(CANDIDATE_COLUMNS)
         )
-        self.models["ranker_pointwise"] = RankerModel()
+        users = candidates[Columns.User]
+
+        if candidates[Columns.Item].dtype.kind in ("O", "U", "S"):
+            lengths = None
+            for column in CANDIDATE_COLUMNS:
+                candidates[column], lengths = MainPipeline._explode(
+                    candidates[column]
+                )
+            users = np.repeat(users, lengths)
+
+        return RaggedIndex.from_columns(
+            users,
+            {
+                column: np.asarray(candidates[column]).astype(dtype)
+                for column, dtype in CANDIDATE_COLUMNS.items()
+            },
+            keys=IdMapping(np.unique(users)),
+        )
+
+    def _get_candidates(self, user_id: int) -> tp.Dict[str, np.ndarray]:
+        two_stage = self.type_model["two_stage"]
+        if two_stage.get("candidates_source") == "online":
+            return self.models["vector_model"].get_candidates(
+                user_id, two_stage["n_candidates"],
+            )
+        return self.models["candidates"].row(user_id)
+
+    def _get_candidates_batch(
+        self,
+        user_ids: tp.List[int],
+    ) -> tp.List[tp.Dict[str, np.ndarray]]:
+        two_stage = self.type_model["two_stage"]
+        if two_stage.get("candidates_source") == "online":
+            return self.models["vector_model"].get_candidates_batch(
+                user_ids, two_stage["n_candidates"],
+            )
+        return [self.models["candidates"].row(user_id) for user_id in user_ids]
 
     def recommend(self, user_id: int, k_recs: int) -> tp.List[int]:
 
-        if self.type_model["one_stage"]["run"]:
+        if "one_stage" in self.type_model:
             return self.models[
                 self.type_model["one_stage"]["model"]
             ].recommend(user_id, k_recs)
 
-        elif self.type_model["two_stage"]["run"]:
-            candidates = self.models["candidates"][
-                self.models["candidates"]["user_id"] == user_id
-            ].explode(
-                column=["item_id", "lfm_score", "rank"]
-            )[[Columns.Item, "lfm_score", "rank"]]
+        elif "two_stage" in self.type_model:
+            candidates = self._get_candidates(user_id)
 
-            if len(candidates) == 0:
+            if len(candidates[Columns.Item]) == 0:
                 return []
 
             return self.models[
@@ -69,3 +141,24 @@ class MainPipeline:
 
         else:
             return []
+
+    def recommend_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+    ) -> tp.List[tp.List[int]]:
+        """
+        Recommendations for several users, batched if the model supports it
+        """
+        if "one_stage" in self.type_model:
+            model = self.models[self.type_model["one_stage"]["model"]]
+            if hasattr(model, "recommend_batch"):
+                return model.recommend_batch(user_ids, k_recs)
+
+        elif "two_stage" in self.type_model:
+            candidates = self._get_candidates_batch(user_ids)
+            return self.models[
+                self.type_model["two_stage"]["model_ranker"]
+            ].recommend_batch(user_ids, k_recs, candidates)
+
+        return [self.recommend(user_id, k_recs) for user_id in user_ids]
@@ -0,0 +1,98 @@
+"""
+Compare the exact and HNSW retrieval engines on the served embeddings:
+query latency (single and batched) and recall@k of HNSW against the
+exact top-k.
+
+    python -m service.models_inference.vector_model.benchmark --k 10
+"""
+import argparse
+import time
+import typing as tp
+
+import numpy as np
+import yaml
+
+from service.models_inference.vector_model.exact_search import ExactIndex
+from service.models_inference.vector_model.hnsw_index import (
+    build_index,
+    index_checksum,
+    load_index,
+)
+
+CONFIG_PATH = "./service/configs/inference-vector-model.cfg.yml"
+
+
+def _measure(
+    index,
+    users: np.ndarray,
+    k: int,
+    num_threads: int,
+) -> tp.Tuple[tp.Dict[str, float], tp.List[np.ndarray]]:
+    started_at = time.perf_counter()
+    single = [index.knnQuery(user, k=k)[0] for user in users]
+    single_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    index.knnQueryBatch(users, k=k, num_threads=num_threads)
+    batch_seconds = time.perf_counter() - started_at
+
+    return {
+        "single_ms_per_user": 1000 * single_seconds / len(users),
+        "batch_ms_per_user": 1000 * batch_seconds / len(users),
+    }, single
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--n-users", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-threads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+
+    with open(args.config) as models_config:
+        params = yaml.safe_load(models_config)
+
+    user_embeddings = np.load(params["user_embeddings"], mmap_mode="r")
+    item_embeddings = np.load(params["item_embeddings"])
+    approximate_search = params["approximate_search"]
+
+    rng = np.random.default_rng(args.seed)
+    users = np.asarray(user_embeddings[np.sort(rng.choice(
+        len(user_embeddings),
+        size=min(args.n_users, len(user_embeddings)),
+        replace=False,
+    ))])
+
+    started_at = time.perf_counter()
+    exact = ExactIndex(item_embeddings)
+    exact_build = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    hnsw = load_index(
+        item_embeddings,
+        approximate_search,
+        params.get("index_path", ""),
+        index_checksum(item_embeddings, approximate_search),
+    )
+    if hnsw is None:
+        hnsw = build_index(item_embeddings, approximate_search)
+    hnsw_build = time.perf_counter() - started_at
+
+    exact_stats, exact_recs = _measure(exact, users, args.k, args.num_threads)
+    hnsw_stats, hnsw_recs = _measure(hnsw, users, args.k, args.num_threads)
+
+    recall = np.mean([
+        len(np.intersect1d(exact_user, hnsw_user)) / len(exact_user)
+        for exact_user, hnsw_user in zip(exact_recs, hnsw_recs)
+    ])
+
+    print(f"items: {len(item_embeddings)}, users: {len(users)}, k: {args.k}")
+    print(f"exact: build {exact_build:.3f}s, {exact_stats}")
+    print(f"hnsw:  build/load {hnsw_build:.3f}s, {hnsw_stats}")
+    print(f"hnsw recall@{args.k} vs exact: {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import typing as tp
+
+import numpy as np
+
+
+class ExactIndex:
+    """
+    Exact top-k search by inner product over item embeddings.
+
+    Has the query interface of the nmslib index with 'negdotprod'
+    space, so it can replace HNSW without an index build: distances
+    are negative dot products, nearest items first.
+    """
+
+    def __init__(self, item_embeddings: np.ndarray, batch_size: int = 1024):
+        self.item_embeddings = np.ascontiguousarray(
+            item_embeddings, dtype=np.float32
+        )
+        self.batch_size = batch_size
+
+    def _top_k(
+        self,
+        vectors: np.ndarray,
+        k: int,
+    ) -> tp.Tuple[np.ndarray, np.ndarray]:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scores = vectors @ self.item_embeddings.T
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return (
+                np.empty((len(vectors), 0), dtype=np.int32),
+                np.empty((len(vectors), 0), dtype=np.float32),
+            )
+
+        top_idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top_idx, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+
+        return (
+            np.take_along_axis(top_idx, order, axis=1).astype(np.int32),
+            -np.take_along_axis(top_scores, order, axis=1),
+        )
+
+    def knnQuery(  # pylint: disable=invalid-name
+        self,
+        vector: np.ndarray,
+        k: int = 10,
+    ) -> tp.Tuple[np.ndarray, np.ndarray]:
+        ids, distances = self._top_k(vector[np.newaxis, :], k)
+        return ids[0], distances[0]
+
+    def knnQueryBatch(  # pylint: disable=invalid-name
+        self,
+        vectors: np.ndarray,
+        k: int = 10,
+        num_threads: int = 0,
+    ) -> tp.List[tp.Tuple[np.ndarray, np.ndarray]]:
+        """
+        num_threads is accepted for compatibility, the matrix product
+        is parallelized by BLAS.
+        """
+        results = list()
+        for start in range(0, len(vectors), self.batch_size):
+            ids, distances = self._top_k(
+                vectors[start:start + self.batch_size], k
+            )
+            results.extend(zip(ids, distances))
+        return results
@@ -0,0 +1,132 @@
+"""
+Build, save and load the nmslib index over item embeddings.
+
+The index is built offline next to the item embeddings:
+
+    python -m service.models_inference.vector_model.hnsw_index
+
+and loaded with ``loadIndex`` on startup. A saved index is used only
+if the checksum of the embeddings and index parameters stored with it
+matches the current ones, otherwise it is rebuilt in memory.
+The time the offline build took is stored with the index too, so
+the artifact report can compare it with the load time.
+"""
+import hashlib
+import os
+import sys
+import time
+import typing as tp
+
+import nmslib
+import numpy as np
+import yaml
+
+
+def _meta_path(index_path: str) -> str:
+    return f"{index_path}.meta.yml"
+
+
+def index_checksum(
+    item_embeddings: np.ndarray,
+    approximate_search: tp.Dict,
+) -> str:
+    """
+    Checksum of the embeddings and of the parameters the index depends on.
+    """
+    checksum = hashlib.sha256(
+        np.ascontiguousarray(item_embeddings).tobytes()
+    )
+    checksum.update(str(item_embeddings.dtype).encode())
+    checksum.update(str(item_embeddings.shape).encode())
+    checksum.update(
+        yaml.safe_dump({
+            key: approximate_search[key]
+            for key in ("method", "space_name", "index_time_params")
+        }, sort_keys=True).encode()
+    )
+    return checksum.hexdigest()
+
+
+def _init_index(approximate_search: tp.Dict):
+    return nmslib.init(
+        method=approximate_search["method"],
+        space=approximate_search["space_name"],
+        data_type=nmslib.DataType.DENSE_VECTOR,
+    )
+
+
+def build_index(item_embeddings: np.ndarray, approximate_search: tp.Dict):
+    index = _init_index(approximate_search)
+    index.addDataPointBatch(item_embeddings)
+    index.createIndex(approximate_search["index_time_params"])
+    index.setQueryTimeParams(approximate_search["query_time_params"])
+    return index
+
+
+def save_index(
+    index,
+    index_path: str,
+    checksum: str,
+    build_seconds: tp.Optional[float] = None,
+) -> None:
+    """
+    Save index structure only, embeddings are stored separately.
+    """
+    index.saveIndex(index_path, save_data=False)
+    with open(_meta_path(index_path), "w") as file:
+        yaml.safe_dump(
+            {"checksum": checksum, "build_seconds": build_seconds}, file,
+        )
+
+
+def read_index_meta(index_path: str) -> tp.Dict[str, tp.Any]:
+    """
+    Checksum and build time saved with the index, empty if missing.
+    """
+    meta_path = _meta_path(index_path)
+    if not os.path.exists(meta_path):
+        return dict()
+    with open(meta_path) as file:
+        return yaml.safe_load(file) or dict()
+
+
+def load_index(
+    item_embeddings: np.ndarray,
+    approximate_search: tp.Dict,
+    index_path: str,
+    checksum: str,
+):
+    """
+    Load saved index, None if it is missing or stale.
+    """
+    if not os.path.exists(index_path):
+        return None
+    if read_index_meta(index_path).get("checksum") != checksum:
+        return None
+
+    index = _init_index(approximate_search)
+    index.addDataPointBatch(item_embeddings)
+    index.loadIndex(index_path, load_data=False)
+    index.setQueryTimeParams(approximate_search["query_time_params"])
+    return index
+
+
+if __name__ == "__main__":
+    config_path = "./service/configs/inference-vector-model.cfg.yml"
+    if len(sys.argv) > 1:
+        config_path = sys.argv[1]
+
+    with open(config_path) as models_config:
+        params = yaml.safe_load(models_config)
+
+    embeddings = np.load(params["item_embeddings"])
+    search_params = params["approximate_search"]
+    started_at = time.perf_counter()
+    built = build_index(embeddings, search_params)
+    save_index(
+        built,
+        params["index_path"],
+        index_checksum(embeddings, search_params),
+        build_seconds=time.perf_counter() - started_at,
+    )
+    print(f"Index saved to {params['index_path']}")
@@ -1,10 +1,20 @@
+import time
 import typing as tp
 
-import nmslib
 import numpy as np
 import yaml
 
-from service.utils.common_artifact import interactions
+from service.log import app_logger
+from service.models_inference.vector_model.exact_search import ExactIndex
+from service.models_inference.vector_model.hnsw_index import (
+    build_index,
+    index_checksum,
+    load_index,
+    read_index_meta,
+)
+from service.utils import Columns
+from service.utils.artifact_store import artifact_store
+from service.utils.common_artifact import items_mapping, users_mapping
 
 
 class RecommendVectorModel:
@@ -13,40 +23,91 @@ class RecommendVectorModel:
     """
     path_config_run = "./service/configs/inference-vector-model.cfg.yml"
 
-    def __init__(self):
+    def __init__(self, path_config_run: str = None):
         """
         Download model artifact
         """
+        if path_config_run is not None:
+            self.path_config_run = path_config_run
+
         with open(self.path_config_run) as models_config:
             params = yaml.safe_load(models_config)
 
-        self.user_embeddings = np.load(params["user_embeddings"])
-        self.item_embeddings = np.load(params["item_embeddings"])
-
-        approximate_search = params["approximate_search"]
+        self.user_embeddings = artifact_store.get_or_load(
+            params["user_embeddings"],
+            lambda: np.load(params["user_embeddings"], mmap_mode="r"),
+        )
+        self.item_embeddings = artifact_store.get_or_load(
+            params["item_embeddings"],
+            lambda: np.load(params["item_embeddings"], mmap_mode="r"),
+        )
 
         """
         Initialize index for approximate search
         """
-        self.index = nmslib.init(
-            method=approximate_search["method"],
-            space=approximate_search["space_name"],
-            data_type=nmslib.DataType.DENSE_VECTOR,
+        self.query_threads = params["approximate_search"].get(
+            "query_threads", 0
         )
-        self.index.addDataPointBatch(self.item_embeddings)
-        self.index.createIndex(approximate_search["index_time_params"])
-        self.index.setQueryTimeParams(
-            approximate_search["query_time_params"]
+        index_name = (
+            f"{params['item_embeddings']}:{params.get('engine', 'hnsw')}"
+        )
+        self.index = artifact_store.get_or_load(
+            index_name,
+            lambda: self._get_index(params, index_name),
         )
 
         """
         Create item and user mapping
         """
-        users_mapping = dict(enumerate(interactions["user_id"].unique()))
-        self.users_inv_mapping = {v: k for k, v in users_mapping.items()}
-        self.items_inv_mapping = dict(
-            enumerate(interactions["item_id"].unique())
+        self.users_inv_mapping = users_mapping
+        self.items_inv_mapping = items_mapping.external_ids
+
+    def _get_index(self, params: tp.Dict, name: str):
+        """
+        Exact search engine or HNSW index: the saved one
+        if it matches the embeddings, else built on startup.
+        Whether the index was loaded or built and how long it took is
+        reported by the artifact store next to the offline build time.
+        """
+        if params.get("engine") == "exact":
+            return ExactIndex(self.item_embeddings)
+
+        approximate_search = params["approximate_search"]
+        checksum = index_checksum(self.item_embeddings, approximate_search)
+
+        started_at = time.perf_counter()
+        index = None
+        if params.get("index_path"):
+            index = load_index(
+                self.item_embeddings,
+                approximate_search,
+                params["index_path"],
+                checksum,
+            )
+        source = "loaded"
+        if index is None:
+            index = build_index(self.item_embeddings, approximate_search)
+            source = "built"
+        seconds = time.perf_counter() - started_at
+
+        build_seconds: tp.Optional[float] = seconds
+        if source == "loaded":
+            build_seconds = read_index_meta(
+                params["index_path"]
+            ).get("build_seconds")
+        artifact_store.describe(
+            name,
+            index_source=source,
+            index_seconds=round(seconds, 4),
+            index_build_seconds=(
+                None if build_seconds is None else round(build_seconds, 4)
+            ),
         )
+        app_logger.info(
+            f"HNSW index for {params['item_embeddings']} {source} "
+            f"in {seconds:.3f}s"
+        )
+        return index
 
     def recommend(self, user_id: int, k_recs: int) -> tp.List[int]:
         """
@@ -57,6 +118,88 @@ class RecommendVectorModel:
             items_idx = self.index.knnQuery(
                 self.user_embeddings[avatar_idx], k=k_recs
             )[0].tolist()
-            return [self.items_inv_mapping[idx] for idx in items_idx]
+            return self.items_inv_mapping[items_idx].tolist()
         else:
             return []
+
+    def get_candidates(
+        self,
+        user_id: int,
+        n_candidates: int,
+    ) -> tp.Dict[str, np.ndarray]:
+        """
+        Candidates for the ranker from the index: lfm_score is the dot
+        product of user and item embeddings, rank starts from 1.
+        """
+        items_idx = np.array([], dtype=np.int32)
+        distances = np.array([], dtype=np.float32)
+        if user_id in self.users_inv_mapping:
+            avatar_idx = self.users_inv_mapping[user_id]
+            items_idx, distances = self.index.knnQuery(
+                self.user_embeddings[avatar_idx], k=n_candidates
+            )
+
+        return self._to_candidates(items_idx, distances)
+
+    def _to_candidates(
+        self,
+        items_idx: np.ndarray,
+        distances: np.ndarray,
+    ) -> tp.Dict[str, np.ndarray]:
+        return {
+            Columns.Item: self.items_inv_mapping[items_idx],
+            "lfm_score": -np.asarray(distances, dtype=np.float32),
+            Columns.Rank: np.arange(1, len(items_idx) + 1, dtype=np.int32),
+        }
+
+    def get_candidates_batch(
+        self,
+        user_ids: tp.List[int],
+        n_candidates: int,
+    ) -> tp.List[tp.Dict[str, np.ndarray]]:
+        """
+        Candidates for several users with one batched index query.
+        """
+        empty = (np.array([], dtype=np.int32), np.array([], dtype=np.float32))
+        results = [empty] * len(user_ids)
+
+        avatars_idx = self.users_inv_mapping.to_internal(user_ids)
+        known = np.flatnonzero(avatars_idx != -1)
+        if len(known):
+            batch = self.index.knnQueryBatch(
+                self.user_embeddings[avatars_idx[known]],
+                k=n_candidates,
+                num_threads=self.query_threads,
+            )
+            for position, result in zip(known, batch):
+                results[position] = result
+
+        return [
+            self._to_candidates(items_idx, distances)
+            for items_idx, distances in results
+        ]
+
+    def recommend_batch(
+        self,
+        user_ids: tp.List[int],
+        k_recs: int,
+    ) -> tp.List[tp.List[int]]:
+        """
+        get reco for several users with one batched index query
+        """
+        recs: tp.List[tp.List[int]] = [[] for _ in user_ids]
+
+        avatars_idx = self.users_inv_mapping.to_internal(user_ids)
+        known = np.flatnonzero(avatars_idx != -1)
+        if len(known) == 0:
+            return recs
+
+        results = self.index.knnQueryBatch(
+            self.user_embeddings[avatars_idx[known]],
+            k=k_recs,
+            num_threads=self.query_threads,
+        )
+        for position, (items_idx, _) in zip(known, results):
+            recs[position] = self.items_inv_mapping[items_idx].tolist()
+
+        return recs
@@ -20,14 +20,70 @@ class LogConfig(Config):
         }
 
 
+class InferenceConfig(Config):
+    # can have two meanings: thread / process. A process pool is forked
+    # from the worker and forked again after every lazily loaded model,
+    # list the served models in warmup of pipeline.cfg.yml to avoid it
+    executor: str = "thread"
+    max_workers: int = 4
+    max_queue_size: int = 64
+    timeout: float = 1.0
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "inference_"
+
+
+class BatchingConfig(Config):
+    max_batch_size: int = 64
+    max_wait_ms: float = 2.0
+    stream_chunk_size: int = 512  # users per call of the batch endpoint
+    stream_timeout: float = 30.0  # seconds per chunk of the batch endpoint
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "batching_"
+
+
+class CacheConfig(Config):
+    enabled: bool = True
+    backend: str = "memory"  # can have two meanings: memory / sqlite
+    max_size: int = 100_000
+    ttl: float = 300.0
+    sqlite_path: str = "./reco_cache.sqlite3"  # used by sqlite backend
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "cache_"
+
+
+class ReloadConfig(Config):
+    watch: bool = False  # reload models when their files change
+    poll_interval: float = 2.0
+    # replaced on POST /admin/reload, polled by the processes that reload
+    generation_path: str = "./service/weights/reload_generation"
+
+    class Config:
+        case_sensitive = False
+        env_prefix = "reload_"
+
+
 class ServiceConfig(Config):
     service_name: str = "reco_service"
     k_recs: int = 10
 
     log_config: LogConfig
+    inference_config: InferenceConfig
+    batching_config: BatchingConfig
+    cache_config: CacheConfig
+    reload_config: ReloadConfig
 
 
 def get_config() -> ServiceConfig:
     return ServiceConfig(
         log_config=LogConfig(),
+        inference_config=InferenceConfig(),
+        batching_config=BatchingConfig(),
+        cache_config=CacheConfig(),
+        reload_config=ReloadConfig(),
     )
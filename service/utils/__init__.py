@@ -1,5 +1,11 @@
 from service.utils.columns import Columns
+from service.utils.features import FeatureTable
+from service.utils.mapping import IdMapping
+from service.utils.ragged import RaggedIndex
 
 __all__ = [
-    "Columns"
+    "Columns",
+    "FeatureTable",
+    "IdMapping",
+    "RaggedIndex",
 ]
@@ -0,0 +1,221 @@
+import contextlib
+import mmap
+import threading
+import time
+import typing as tp
+
+import numpy as np
+import pandas as pd
+
+PAGEMAP_PATH = "/proc/self/pagemap"
+PAGE_PRESENT = np.uint64(1 << 63)
+PAGE_EXCLUSIVE = np.uint64(1 << 56)
+
+
+def _children(obj: tp.Any) -> tp.Iterable[tp.Any]:
+    """
+    Objects held by an artifact that may hold numpy buffers.
+    """
+    if isinstance(obj, pd.Series):
+        return [np.asarray(obj)]
+    if isinstance(obj, pd.DataFrame):
+        return [np.asarray(obj[column]) for column in obj.columns]
+    if hasattr(obj, "indptr") and hasattr(obj, "indices"):
+        return [obj.data, obj.indices, obj.indptr]
+    if isinstance(obj, dict):
+        return obj.values()
+    if isinstance(obj, (list, tuple)):
+        return obj
+    if hasattr(obj, "__dict__"):
+        return [vars(obj)]
+    return []
+
+
+def _iter_arrays(
+    obj: tp.Any,
+    seen: tp.Optional[tp.Set[int]] = None,
+) -> tp.Iterator[np.ndarray]:
+    """
+    Walk an artifact and yield every numpy buffer it holds.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        yield obj
+        return
+    for child in _children(obj):
+        yield from _iter_arrays(child, seen)
+
+
+def _array_ranges(arrays: tp.Iterable[np.ndarray]) -> tp.List[tp.List[int]]:
+    """
+    Merge the memory ranges occupied by arrays, views share their base.
+    """
+    ranges = []
+    for array in arrays:
+        if array.nbytes == 0 or array.dtype == object:
+            continue
+        start = array.__array_interface__["data"][0]
+        ranges.append([start, start + array.nbytes])
+
+    merged: tp.List[tp.List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _page_flags(start: int, end: int) -> tp.Optional[np.ndarray]:
+    """
+    Read /proc/self/pagemap entries for pages in [start, end).
+    """
+    first_page = start // mmap.PAGESIZE
+    last_page = (end - 1) // mmap.PAGESIZE
+    try:
+        with open(PAGEMAP_PATH, "rb") as pagemap:
+            pagemap.seek(first_page * 8)
+            raw = pagemap.read((last_page - first_page + 1) * 8)
+    except OSError:
+        return None
+    return np.frombuffer(raw, dtype=np.uint64)
+
+
+def memory_usage(obj: tp.Any) -> tp.Dict[str, int]:
+    """
+    Bytes held by the numpy buffers of an artifact: total size,
+    pages resident in this process and resident pages that are
+    shared with another process (e.g. the gunicorn master).
+    If pagemap is unavailable resident size falls back to nbytes.
+    """
+    ranges = _array_ranges(_iter_arrays(obj))
+    usage = {"nbytes": 0, "resident_bytes": 0, "shared_bytes": 0}
+
+    for start, end in ranges:
+        usage["nbytes"] += end - start
+        flags = _page_flags(start, end)
+        if flags is None:
+            usage["resident_bytes"] += end - start
+            continue
+        present = (flags & PAGE_PRESENT) != 0
+        shared = present & ((flags & PAGE_EXCLUSIVE) == 0)
+        usage["resident_bytes"] += int(present.sum()) * mmap.PAGESIZE
+        usage["shared_bytes"] += int(shared.sum()) * mmap.PAGESIZE
+
+    return usage
+
+
+class ArtifactStore:
+    """
+    Process-wide registry of read-only artifacts.
+
+    Every model, mapping and feature table is loaded once through
+    ``get_or_load``. When the application is preloaded in the gunicorn
+    master the artifacts are created before fork, so workers share
+    their pages copy-on-write instead of holding a private copy each.
+    Artifacts should therefore be kept as numpy arrays rather than
+    python containers, whose refcount updates unshare the pages.
+
+    On reload new artifacts are loaded into a staging store by one
+    thread, while other threads keep reading the current ones, and the
+    staging store then replaces the current one.
+    """
+
+    def __init__(self):
+        self._artifacts: tp.Dict[str, tp.Any] = dict()
+        self._load_seconds: tp.Dict[str, float] = dict()
+        self._details: tp.Dict[str, tp.Dict[str, tp.Any]] = dict()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._artifacts
+
+    def get_or_load(self, name: str, loader: tp.Callable[[], tp.Any]):
+        """
+        Return artifact ``name``, calling ``loader`` on first access.
+        """
+        staging = getattr(self._local, "staging", None)
+        if staging is not None:
+            return staging.get_or_load(name, loader)
+
+        with self._lock:
+            if name not in self._artifacts:
+                started_at = time.perf_counter()
+                self._artifacts[name] = loader()
+                self._load_seconds[name] = time.perf_counter() - started_at
+            return self._artifacts[name]
+
+    def describe(self, name: str, **details: tp.Any) -> None:
+        """
+        Add ``details`` of how artifact ``name`` was loaded
+        to its memory report, e.g. from its loader.
+        """
+        staging = getattr(self._local, "staging", None)
+        if staging is not None:
+            staging.describe(name, **details)
+            return
+
+        with self._lock:
+            self._details.setdefault(name, dict()).update(details)
+
+    def staging(self, keep: tp.Iterable[str] = ()) -> "ArtifactStore":
+        """
+        Empty store for a reload, holding only artifacts ``keep``
+        of this one.
+        """
+        store = ArtifactStore()
+        with self._lock:
+            for name in keep:
+                if name in self._artifacts:
+                    store._artifacts[name] = self._artifacts[name]
+                    store._load_seconds[name] = self._load_seconds[name]
+                if name in self._details:
+                    store._details[name] = self._details[name]
+        return store
+
+    @contextlib.contextmanager
+    def loading_into(self, store: "ArtifactStore") -> tp.Iterator[None]:
+        """
+        Artifacts requested by the current thread are loaded into
+        ``store`` instead of this one.
+        """
+        self._local.staging = store
+        try:
+            yield
+        finally:
+            self._local.staging = None
+
+    def replace(self, store: "ArtifactStore") -> None:
+        """
+        Take the artifacts of ``store``, the previous ones are released
+        once nothing else refers to them.
+        """
+        with self._lock:
+            self._artifacts = store._artifacts
+            self._load_seconds = store._load_seconds
+            self._details = store._details
+
+    def memory_report(self) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+        """
+        Per-artifact size, resident/shared bytes, load time
+        and details added by ``describe``.
+        """
+        with self._lock:
+            artifacts = dict(self._artifacts)
+            details = dict(self._details)
+
+        report = dict()
+        for name, artifact in artifacts.items():
+            report[name] = memory_usage(artifact)
+            report[name]["load_seconds"] = round(self._load_seconds[name], 4)
+            report[name].update(details.get(name, {}))
+        return report
+
+
+artifact_store = ArtifactStore()
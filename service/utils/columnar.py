@@ -0,0 +1,203 @@
+"""
+Typed binary column store for the csv tables loaded at startup.
+
+A table ``path/name.csv`` is converted once into the directory
+``path/name.columns`` holding one ``.npy`` file per column and a
+``meta.yml`` with column names. Numeric columns are memory-mapped
+on load, string columns are stored as fixed width unicode arrays.
+Loaders fall back to the csv file when no converted table exists
+or when the csv file changed after conversion.
+
+Convert every csv table referenced by the service configs:
+
+    python -m service.utils.columnar
+
+or only the given files:
+
+    python -m service.utils.columnar ./service/data/candidates.csv
+"""
+import glob
+import os
+import sys
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import yaml
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from service.log import app_logger
+
+COLUMNS_SUFFIX = ".columns"
+META_FILE = "meta.yml"
+CONFIGS_PATTERN = "./service/configs/*.yml"
+
+
+def columnar_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + COLUMNS_SUFFIX
+
+
+def file_stamp(path: str) -> tp.Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_table(
+    df: pd.DataFrame,
+    path: str,
+    source: tp.Optional[str] = None,
+    extra_meta: tp.Optional[tp.Dict[str, tp.Any]] = None,
+) -> None:
+    """
+    Write dataframe to column store directory ``path``,
+    ``source`` is the file the table is converted from.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    meta: tp.Dict[str, tp.Any] = dict(extra_meta or {})
+    meta.update({"columns": [], "nulls": []})
+    if source is not None:
+        meta["source"] = file_stamp(source)
+    for idx, column in enumerate(df.columns):
+        values = df[column]
+        if is_numeric_dtype(values) or is_bool_dtype(values):
+            array = np.asarray(values)
+        else:
+            isna = values.isna().values
+            if isna.any():
+                np.save(os.path.join(path, f"col_{idx}.isna.npy"), isna)
+                meta["nulls"].append(str(column))
+            array = np.asarray(values.where(~isna, "")).astype(str)
+        np.save(
+            os.path.join(path, f"col_{idx}.npy"), array, allow_pickle=False
+        )
+        meta["columns"].append(str(column))
+
+    with open(os.path.join(path, META_FILE), "w") as file:
+        yaml.safe_dump(meta, file, allow_unicode=True)
+
+
+def convert_csv(csv_path: str) -> str:
+    """
+    One-shot conversion of a csv table into the column store.
+    """
+    path = columnar_path(csv_path)
+    write_table(pd.read_csv(csv_path), path, source=csv_path)
+    return path
+
+
+def read_meta(path: str) -> tp.Dict[str, tp.Any]:
+    with open(os.path.join(path, META_FILE)) as file:
+        return yaml.safe_load(file)
+
+
+def _converted_meta(csv_path: str) -> tp.Optional[tp.Dict[str, tp.Any]]:
+    """
+    Meta of the converted table, None if there is none or it is older
+    than its csv file. Tables written without csv are always used.
+    """
+    path = columnar_path(csv_path)
+    if not os.path.isdir(path):
+        return None
+
+    meta = read_meta(path)
+    if os.path.exists(csv_path) and (
+        meta.get("source") != file_stamp(csv_path)
+    ):
+        app_logger.error(
+            f"{path} is not converted from the current {csv_path}, "
+            f"csv is read, convert it again"
+        )
+        return None
+    return meta
+
+
+def _load_columns(
+    path: str,
+    stored: tp.List[str],
+    columns: tp.Optional[tp.Sequence[str]],
+) -> tp.Dict[str, np.ndarray]:
+    columns = stored if columns is None else columns
+    return {
+        column: np.load(
+            os.path.join(path, f"col_{stored.index(column)}.npy"),
+            mmap_mode="r",
+        )
+        for column in columns
+    }
+
+
+def read_columns(
+    csv_path: str,
+    columns: tp.Optional[tp.Sequence[str]] = None,
+) -> tp.Dict[str, np.ndarray]:
+    """
+    Read table columns as numpy arrays, memory-mapped if the table was
+    converted, otherwise parsed from csv. Nulls in string columns of a
+    converted table are read as empty strings.
+    """
+    meta = _converted_meta(csv_path)
+    if meta is None:
+        df = pd.read_csv(csv_path, usecols=columns)
+        columns = df.columns if columns is None else columns
+        return {column: df[column].values for column in columns}
+
+    return _load_columns(columnar_path(csv_path), meta["columns"], columns)
+
+
+def read_table(
+    csv_path: str,
+    columns: tp.Optional[tp.Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Drop-in replacement of ``pd.read_csv(csv_path, usecols=columns)``,
+    numeric columns of a converted table stay memory-mapped.
+    """
+    meta = _converted_meta(csv_path)
+    if meta is None:
+        return pd.read_csv(csv_path, usecols=columns)
+
+    path = columnar_path(csv_path)
+    data = _load_columns(path, meta["columns"], columns)
+    for column, values in data.items():
+        if values.dtype.kind == "U":
+            values = values.astype(object)
+            if column in meta["nulls"]:
+                idx = meta["columns"].index(column)
+                isna = np.load(os.path.join(path, f"col_{idx}.isna.npy"))
+                values[isna] = np.nan
+            data[column] = values
+
+    # not consolidated, so the columns are not copied into blocks
+    return pd.DataFrame(data, copy=False)
+
+
+def _config_tables(config: tp.Any, suffix: str) -> tp.Iterator[str]:
+    if isinstance(config, dict):
+        for value in config.values():
+            yield from _config_tables(value, suffix)
+    elif isinstance(config, list):
+        for value in config:
+            yield from _config_tables(value, suffix)
+    elif isinstance(config, str) and config.endswith(suffix):
+        yield config
+
+
+def configured_tables(suffix: str = ".csv") -> tp.List[str]:
+    """
+    Files with ``suffix`` referenced by the service configs,
+    csv tables by default.
+    """
+    tables = list()
+    for config_path in sorted(glob.glob(CONFIGS_PATTERN)):
+        with open(config_path) as file:
+            tables.extend(_config_tables(yaml.safe_load(file), suffix))
+    return sorted(set(tables))
+
+
+if __name__ == "__main__":
+    for table in sys.argv[1:] or configured_tables():
+        if os.path.exists(table):
+            print(f"{table} -> {convert_csv(table)}")
+        else:
+            print(f"{table} not found, skipped")
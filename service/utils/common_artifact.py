@@ -1,14 +1,52 @@
-import pandas as pd
+import numpy as np
 import yaml
 
 from service.utils import Columns
+from service.utils.artifact_store import artifact_store
+from service.utils.columnar import read_columns, read_table
+from service.utils.mapping import IdMapping
+from service.utils.ragged import RaggedIndex
 
 PATH_CONFIG_FILE = "./service/configs/common-data.cfg.yml"
+# loaded once on import, kept by model reloads
+COMMON_ARTIFACTS = (
+    "popular_items", "interactions", "users_mapping", "items_mapping",
+    "watched",
+)
 
 with open(PATH_CONFIG_FILE) as models_config:
     data = yaml.safe_load(models_config)
 
-registered_model = data["registered_model"]
 explained_model = data["explained_model"]
-popular_items = pd.read_csv(data["popular_items"])[Columns.Item].tolist()
-interactions = pd.read_csv(data["interactions"])
+popular_items = artifact_store.get_or_load(
+    "popular_items",
+    lambda: read_columns(data["popular_items"], [Columns.Item])[Columns.Item],
+).tolist()
+interactions = artifact_store.get_or_load(
+    "interactions",
+    lambda: read_table(data["interactions"], Columns.UserItem),
+)
+users_mapping = artifact_store.get_or_load(
+    "users_mapping",
+    lambda: IdMapping.from_values(interactions[Columns.User]),
+)
+items_mapping = artifact_store.get_or_load(
+    "items_mapping",
+    lambda: IdMapping.from_values(interactions[Columns.Item]),
+)
+
+
+def get_watched() -> RaggedIndex:
+    """
+    Watched items of every user in interactions order.
+    """
+    return artifact_store.get_or_load(
+        "watched",
+        lambda: RaggedIndex.from_columns(
+            interactions[Columns.User].values,
+            {Columns.Item: interactions[Columns.Item].values.astype(
+                np.int32
+            )},
+            keys=users_mapping,
+        ),
+    )
@@ -0,0 +1,52 @@
+import typing as tp
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from service.utils.mapping import IdMapping
+
+
+class FeatureTable:
+    """
+    Feature columns of users or items indexed by id.
+
+    Numeric columns keep their dtype, string columns are encoded
+    with ``astype(str)`` once at load into fixed width arrays.
+    """
+
+    def __init__(self, df: pd.DataFrame, id_column: str):
+        self.ids = IdMapping(df[id_column].values)
+        self.columns = {
+            column: self._encode(df[column])
+            for column in df.columns if column != id_column
+        }
+
+    @staticmethod
+    def _encode(values: pd.Series) -> np.ndarray:
+        if is_numeric_dtype(values):
+            return values.values
+        return np.asarray(values.astype(str)).astype(str)
+
+    def rows(self, ids: tp.Iterable[int]) -> np.ndarray:
+        return self.ids.to_internal(ids)
+
+    def take(self, column: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Feature values of several rows in the column dtype. Unknown ids
+        (row -1) get NaN, integer columns with them become float, string
+        columns get "nan" as missing strings are encoded at load.
+        """
+        rows = np.asarray(rows)
+        values = self.columns[column][rows]
+        missing = rows == -1
+        if not missing.any():
+            return values
+
+        if values.dtype.kind == "U":
+            values = values.astype(np.result_type(values.dtype, "<U3"))
+            values[missing] = "nan"
+        else:
+            values = values.astype(np.result_type(values.dtype, np.float32))
+            values[missing] = np.nan
+        return values
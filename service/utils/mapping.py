@@ -0,0 +1,112 @@
+import typing as tp
+
+import numpy as np
+import pandas as pd
+
+# ids are looked up in a dense table if it is at most this many times
+# longer than the number of ids, otherwise by binary search
+DENSE_MAX_RATIO = 8
+DENSE_MIN_SIZE = 1 << 16
+
+
+class IdMapping:
+    """
+    Mapping between external ids and contiguous internal indices.
+
+    Both directions are stored as flat numpy arrays, so the mapping
+    stays in pages shared between forked workers instead of in dicts
+    of boxed ints whose refcounts are touched on every lookup.
+    Internal index ``i`` corresponds to ``external_ids[i]``.
+    Integer ids in a compact range are looked up in O(1) in a dense
+    ``id - offset -> index`` table, sparse or non integer ids by binary
+    search.
+    """
+
+    def __init__(self, external_ids: np.ndarray):
+        self.external_ids = np.asarray(external_ids)
+        self._order = np.argsort(
+            self.external_ids, kind="stable"
+        ).astype(np.int32)
+        self._sorted_ids = self.external_ids[self._order]
+
+        self._dense: tp.Optional[np.ndarray] = None
+        self._offset = 0
+        if self._dense_size() is not None:
+            self._build_dense()
+
+    def _dense_size(self) -> tp.Optional[int]:
+        ids = self.external_ids
+        if len(ids) == 0 or ids.dtype.kind not in "iu":
+            return None
+        size = int(ids.max()) - int(ids.min()) + 1
+        if size > max(DENSE_MAX_RATIO * len(ids), DENSE_MIN_SIZE):
+            return None
+        return size
+
+    def _build_dense(self) -> None:
+        self._offset = int(self.external_ids.min())
+        self._dense = np.full(self._dense_size(), -1, dtype=np.int32)
+        # reversed, so the first of repeated ids wins as with searchsorted
+        positions = self.external_ids.astype(np.int64) - self._offset
+        self._dense[positions[::-1]] = np.arange(
+            len(positions) - 1, -1, -1, dtype=np.int32,
+        )
+
+    @classmethod
+    def from_values(cls, values: tp.Iterable) -> "IdMapping":
+        """
+        Build mapping from ids in order of first appearance,
+        the same order as ``dict(enumerate(values.unique()))``.
+        """
+        return cls(pd.unique(np.asarray(values)))
+
+    def __len__(self) -> int:
+        return len(self.external_ids)
+
+    def __contains__(self, external_id: int) -> bool:
+        return self.lookup(external_id) != -1
+
+    def __getitem__(self, external_id: int) -> int:
+        internal_id = self.lookup(external_id)
+        if internal_id == -1:
+            raise KeyError(external_id)
+        return internal_id
+
+    def lookup(self, external_id: int) -> int:
+        """
+        Internal index of one id, -1 if the id is unknown.
+        """
+        if self._dense is not None and isinstance(
+            external_id, (int, np.integer)
+        ):
+            position = int(external_id) - self._offset
+            if 0 <= position < len(self._dense):
+                return int(self._dense[position])
+            return -1
+        return int(self.to_internal([external_id])[0])
+
+    def to_internal(self, external_ids: tp.Iterable) -> np.ndarray:
+        """
+        Vectorized external -> internal lookup, unknown ids map to -1.
+        """
+        external_ids = np.asarray(external_ids)
+        if self._dense is not None and external_ids.dtype.kind in "iu":
+            positions = external_ids.astype(np.int64) - self._offset
+            in_range = (positions >= 0) & (positions < len(self._dense))
+            internal_ids = np.full(external_ids.shape, -1, dtype=np.int32)
+            internal_ids[in_range] = self._dense[positions[in_range]]
+            return internal_ids
+
+        if len(self._sorted_ids) == 0:
+            return np.full(external_ids.shape, -1, dtype=np.int32)
+
+        positions = np.searchsorted(self._sorted_ids, external_ids)
+        positions = np.minimum(positions, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[positions] == external_ids
+        return np.where(found, self._order[positions], -1).astype(np.int32)
+
+    def to_external(self, internal_ids: tp.Iterable) -> np.ndarray:
+        """
+        Vectorized internal -> external lookup.
+        """
+        return self.external_ids[np.asarray(internal_ids, dtype=np.int64)]
@@ -0,0 +1,180 @@
+"""
+Exported models loaded without unpickling.
+
+A model ``path/name.dill`` is exported once into the directory
+``path/name.export``. Implicit models are stored as one ``.npy`` file
+per array attribute (factors of ALS, the three arrays of the sparse
+similarity matrix of nearest neighbours models) and a ``meta.yml``
+with the class and the plain attributes. CatBoost models are stored
+in their native ``model.cbm``. Arrays are memory-mapped on load,
+so workers share them through the page cache.
+
+Export every model referenced by the service configs:
+
+    python -m service.utils.model_export
+
+or only the given files:
+
+    python -m service.utils.model_export ./service/weights/als/als.dill
+
+An export is used only if it was made from the model file it lies next
+to, otherwise the model is unpickled with dill.
+"""
+import importlib
+import os
+import sys
+import typing as tp
+
+import numpy as np
+import yaml
+from scipy import sparse
+
+from service.utils.columnar import configured_tables
+
+EXPORT_SUFFIX = ".export"
+META_FILE = "meta.yml"
+CATBOOST_FILE = "model.cbm"
+PACKAGES = ("implicit", "catboost")
+
+
+def exported_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + EXPORT_SUFFIX
+
+
+def _model_stamp(model_path: str) -> tp.Dict[str, int]:
+    stat = os.stat(model_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _plain(value: tp.Any) -> bool:
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def _export_state(model: tp.Any, path: str) -> tp.Dict[str, tp.Any]:
+    state: tp.Dict[str, tp.Any] = {
+        "plain": {}, "dtypes": {}, "arrays": [], "sparse": {}, "skipped": [],
+    }
+    for name, value in vars(model).items():
+        if isinstance(value, np.generic):
+            value = value.item()
+
+        if _plain(value):
+            state["plain"][name] = value
+        elif isinstance(value, np.dtype):
+            state["dtypes"][name] = value.str
+        elif isinstance(value, np.ndarray):
+            np.save(os.path.join(path, f"{name}.npy"), value)
+            state["arrays"].append(name)
+        elif sparse.issparse(value):
+            value = sparse.csr_matrix(value)
+            for part in ("data", "indices", "indptr"):
+                np.save(
+                    os.path.join(path, f"{name}.{part}.npy"),
+                    getattr(value, part),
+                )
+            state["sparse"][name] = list(value.shape)
+        else:
+            state["skipped"].append(name)
+    return state
+
+
+def export_model(model: tp.Any, model_path: str) -> str:
+    """
+    Export ``model`` unpickled from ``model_path`` next to it.
+    """
+    cls = type(model)
+    if cls.__module__.split(".")[0] not in PACKAGES:
+        raise TypeError(f"Export of {cls.__module__}.{cls.__name__} "
+                        f"is not supported")
+
+    path = exported_path(model_path)
+    os.makedirs(path, exist_ok=True)
+    meta: tp.Dict[str, tp.Any] = {
+        "module": cls.__module__,
+        "class": cls.__name__,
+        "model": _model_stamp(model_path),
+    }
+    if cls.__module__.startswith("catboost"):
+        model.save_model(os.path.join(path, CATBOOST_FILE), format="cbm")
+    else:
+        meta["state"] = _export_state(model, path)
+
+    # meta is written last, a partial export is never loaded
+    with open(os.path.join(path, META_FILE), "w") as file:
+        yaml.safe_dump(meta, file)
+    return path
+
+
+def _load_state(path: str, state: tp.Dict[str, tp.Any]) -> tp.Dict:
+    attributes = dict(state["plain"])
+    for name, dtype in state["dtypes"].items():
+        attributes[name] = np.dtype(dtype)
+    for name in state["arrays"]:
+        attributes[name] = np.load(
+            os.path.join(path, f"{name}.npy"), mmap_mode="r",
+        )
+    for name, shape in state["sparse"].items():
+        data, indices, indptr = (
+            np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode="r")
+            for part in ("data", "indices", "indptr")
+        )
+        attributes[name] = sparse.csr_matrix(
+            (data, indices, indptr), shape=tuple(shape), copy=False,
+        )
+    # e.g. the scorer of a nearest neighbours model, not used on inference
+    for name in state["skipped"]:
+        attributes[name] = None
+    return attributes
+
+
+def load_exported(model_path: str) -> tp.Optional[tp.Any]:
+    """
+    Model rebuilt from its export, None if it is missing or was
+    made from another model file.
+    """
+    path = exported_path(model_path)
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as file:
+        meta = yaml.safe_load(file)
+    if meta.get("model") != _model_stamp(model_path):
+        return None
+    if meta["module"].split(".")[0] not in PACKAGES:
+        return None
+
+    # implicit and catboost are imported only when their model is used
+    cls = getattr(importlib.import_module(meta["module"]), meta["class"])
+    if meta["module"].startswith("catboost"):
+        return cls().load_model(os.path.join(path, CATBOOST_FILE))
+
+    model = cls.__new__(cls)
+    model.__dict__.update(_load_state(path, meta["state"]))
+    return model
+
+
+def _unpickle(model_path: str) -> tp.Any:
+    import dill  # pylint: disable=import-outside-toplevel
+
+    with open(model_path, "rb") as file:
+        return dill.load(file)
+
+
+def load_model(model_path: str) -> tp.Any:
+    """
+    Model from its export if there is one, otherwise unpickled.
+    """
+    model = load_exported(model_path)
+    if model is None:
+        model = _unpickle(model_path)
+    return model
+
+
+if __name__ == "__main__":
+    for model_file in sys.argv[1:] or configured_tables(".dill"):
+        if os.path.exists(model_file):
+            print(f"{model_file} -> "
+                  f"{export_model(_unpickle(model_file), model_file)}")
+        else:
+            print(f"{model_file} not found, skipped")
@@ -0,0 +1,114 @@
+import typing as tp
+
+import numpy as np
+
+from service.utils.mapping import IdMapping
+
+
+def unique_first_seen(values: np.ndarray) -> np.ndarray:
+    """
+    Drop duplicates keeping the first occurrence order.
+    """
+    _, first_idx = np.unique(values, return_index=True)
+    return values[np.sort(first_idx)]
+
+
+def _index_dtype(size: int) -> tp.Type[np.integer]:
+    if size < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+class RaggedIndex:
+    """
+    Variable length rows stored CSR-style in flat arrays.
+
+    Row ``r`` of column ``name`` is
+    ``columns[name][indptr[r]:indptr[r + 1]]`` and rows are addressed
+    by key through ``keys``, so a row lookup is an id table lookup plus
+    a zero-copy slice instead of a scan over the whole table.
+    """
+
+    def __init__(
+        self,
+        keys: IdMapping,
+        indptr: np.ndarray,
+        columns: tp.Dict[str, np.ndarray],
+    ):
+        self.keys = keys
+        self.indptr = indptr
+        self.columns = columns
+
+    @classmethod
+    def from_columns(
+        cls,
+        row_keys: np.ndarray,
+        columns: tp.Dict[str, np.ndarray],
+        keys: tp.Optional[IdMapping] = None,
+    ) -> "RaggedIndex":
+        """
+        Group table rows by ``row_keys`` keeping their original order
+        inside each group. Rows with keys missing in ``keys`` are dropped.
+        """
+        if keys is None:
+            keys = IdMapping.from_values(row_keys)
+
+        rows = keys.to_internal(row_keys)
+        valid = rows >= 0
+        rows = rows[valid]
+        order = np.argsort(rows, kind="stable")
+
+        dtype = _index_dtype(len(rows))
+        indptr = np.zeros(len(keys) + 1, dtype=dtype)
+        np.cumsum(np.bincount(rows, minlength=len(keys)), out=indptr[1:])
+
+        return cls(
+            keys=keys,
+            indptr=indptr,
+            columns={
+                name: np.ascontiguousarray(np.asarray(values)[valid][order])
+                for name, values in columns.items()
+            },
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: int) -> bool:
+        row = self.keys.lookup(key)
+        return row != -1 and self.indptr[row] != self.indptr[row + 1]
+
+    def get(self, key: int, column: str) -> np.ndarray:
+        """
+        Row of ``column`` for ``key``, empty if the key is unknown.
+        """
+        row = self.keys.lookup(key)
+        if row == -1:
+            return self.columns[column][:0]
+        return self.columns[column][self.indptr[row]:self.indptr[row + 1]]
+
+    def row(self, key: int) -> tp.Dict[str, np.ndarray]:
+        """
+        All columns of the row for ``key``, empty if the key is unknown.
+        """
+        return {column: self.get(key, column) for column in self.columns}
+
+    def gather_rows(self, rows: np.ndarray, column: str) -> np.ndarray:
+        """
+        Concatenate rows (internal positions) of ``column`` in order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows].astype(np.int64)
+        lengths = self.indptr[rows + 1] - starts
+        output_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) + np.repeat(
+            starts - output_starts, lengths
+        )
+        return self.columns[column][positions]
+
+    def gather(self, keys: tp.Iterable[int], column: str) -> np.ndarray:
+        """
+        Concatenate rows of ``column`` for ``keys``, unknown keys skipped.
+        """
+        rows = self.keys.to_internal(keys)
+        return self.gather_rows(rows[rows != -1], column)
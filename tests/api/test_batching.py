@@ -0,0 +1,39 @@
+import asyncio
+import typing as tp
+
+from service.api.batching import MicroBatcher
+
+
+def test_micro_batcher_gathers_concurrent_requests() -> None:
+    batches: tp.List[tp.List[int]] = []
+
+    async def run_batch(keys: tp.List[int]) -> tp.List[int]:
+        batches.append(keys)
+        return [key * 10 for key in keys]
+
+    async def submit_all() -> tp.List[int]:
+        batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait=0.01)
+        return await asyncio.gather(
+            *(batcher.submit(key) for key in range(5))
+        )
+
+    results = asyncio.run(submit_all())
+    assert results == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2], [3, 4]]
+
+
+def test_micro_batcher_keeps_running_batches() -> None:
+    started = []
+
+    async def run_batch(keys: tp.List[int]) -> tp.List[int]:
+        started.append(len(batcher._tasks))
+        await asyncio.sleep(0.01)
+        return keys
+
+    async def submit() -> int:
+        return await batcher.submit(1)
+
+    batcher = MicroBatcher(run_batch, max_batch_size=1, max_wait=0.01)
+    assert asyncio.run(submit()) == 1
+    assert started == [1]
+    assert not batcher._tasks
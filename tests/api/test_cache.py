@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+import typing as tp
+
+import pytest
+
+from service.api.cache import MemoryBackend, RecoCache, SqliteBackend
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path) -> tp.Callable[..., RecoCache]:
+    def make(max_size: int = 10, ttl: float = 10.0) -> RecoCache:
+        if request.param == "sqlite":
+            backend = SqliteBackend(
+                str(tmp_path / "cache.sqlite3"), max_size, evict_every=1,
+            )
+        else:
+            backend = MemoryBackend(max_size)
+        return RecoCache(backend, ttl=ttl, clock=FakeClock())
+    return make
+
+
+def test_cache_hit_and_miss(make_cache) -> None:
+    cache = make_cache()
+    assert cache.get("als", 1, 10) is None
+    cache.set("als", 1, 10, [3, 2, 1])
+    assert cache.get("als", 1, 10) == [3, 2, 1]
+    assert cache.get("als", 1, 5) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_ttl(make_cache) -> None:
+    cache = make_cache(ttl=10)
+    cache.set("als", 1, 10, [1])
+    cache.clock.now = 9
+    assert cache.get("als", 1, 10) == [1]
+    cache.clock.now = 10
+    assert cache.get("als", 1, 10) is None
+
+
+def test_cache_lru_eviction(make_cache) -> None:
+    cache = make_cache(max_size=2)
+    cache.set("als", 1, 10, [1])
+    cache.clock.now = 1
+    cache.set("als", 2, 10, [2])
+    cache.clock.now = 2
+    assert cache.get("als", 1, 10) == [1]
+    cache.clock.now = 3
+    cache.set("als", 3, 10, [3])
+    assert cache.get("als", 2, 10) is None
+    assert cache.get("als", 1, 10) == [1]
+    assert cache.get("als", 3, 10) == [3]
+
+
+def test_cache_invalidate(make_cache) -> None:
+    cache = make_cache()
+    cache.set("als", 1, 10, [1])
+    generation = cache.generation
+    cache.invalidate()
+    assert cache.get("als", 1, 10) is None
+    cache.set("als", 1, 10, [1], generation)
+    assert cache.get("als", 1, 10) is None
+
+
+def test_cache_versions_do_not_share_entries(tmp_path) -> None:
+    backend = SqliteBackend(str(tmp_path / "cache.sqlite3"))
+    old = RecoCache(backend, clock=FakeClock(), version="old")
+    new = RecoCache(backend, clock=FakeClock(), version="new")
+    old.set("als", 1, 10, [1])
+    assert new.get("als", 1, 10) is None
+    new.set("als", 1, 10, [2])
+    assert old.get("als", 1, 10) == [1]
+
+    old.invalidate("new")
+    assert old.get("als", 1, 10) is None
+    old.set("als", 1, 10, [2])
+    assert new.get("als", 1, 10) == [2]
+
+
+def test_cache_async(make_cache) -> None:
+    cache = make_cache()
+
+    async def set_and_get() -> tp.Optional[tp.List[int]]:
+        await cache.set_async("als", 1, 10, [3, 2, 1], cache.generation)
+        return await cache.get_async("als", 1, 10)
+
+    assert asyncio.run(set_and_get()) == [3, 2, 1]
+
+
+def test_sqlite_hits_only_read(tmp_path) -> None:
+    backend = SqliteBackend(str(tmp_path / "cache.sqlite3"))
+    backend.set("key", [1], now=0, ttl=10)
+    changes = backend._connection.total_changes
+    assert backend.get("key", now=1) == [1]
+    assert backend._connection.total_changes == changes
+
+
+def test_sqlite_errors_are_misses(tmp_path) -> None:
+    path = str(tmp_path / "cache.sqlite3")
+    cache = RecoCache(SqliteBackend(path, timeout=0.01), clock=FakeClock())
+    cache.set("als", 1, 10, [1])
+
+    with sqlite3.connect(path) as connection:
+        connection.execute("DROP TABLE reco_cache")
+    assert cache.get("als", 1, 10) is None
+    cache.set("als", 1, 10, [1])
+    assert cache.stats()["misses"] == 1
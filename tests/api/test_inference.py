@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from service.api.exceptions import ServiceOverloadedError
+from service.api.inference import InferenceExecutor
+
+
+def slow_identity(value: int, delay: float) -> int:
+    time.sleep(delay)
+    return value
+
+
+def test_inference_returns_result() -> None:
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0, timeout=1)
+    result = asyncio.run(
+        executor.run(slow_identity, 1, 0, fallback=lambda: -1)
+    )
+    executor.shutdown()
+    assert result == 1
+
+
+def test_inference_timeout_returns_fallback() -> None:
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0, timeout=0.01)
+    result = asyncio.run(
+        executor.run(slow_identity, 1, 0.2, fallback=lambda: -1)
+    )
+    executor.shutdown()
+    assert result == -1
+
+
+def test_inference_queue_limit() -> None:
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0, timeout=1)
+
+    async def run_two() -> None:
+        first = asyncio.ensure_future(
+            executor.run(slow_identity, 1, 0.2, fallback=lambda: -1)
+        )
+        await asyncio.sleep(0)
+        try:
+            await executor.run(slow_identity, 2, 0, fallback=lambda: -1)
+        finally:
+            await first
+
+    with pytest.raises(ServiceOverloadedError):
+        asyncio.run(run_two())
+    executor.shutdown()
+
+
+def test_inference_timeout_per_call() -> None:
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0, timeout=0.01)
+    result = asyncio.run(
+        executor.run(slow_identity, 1, 0.05, fallback=lambda: -1,
+                     timeout=1.0)
+    )
+    executor.shutdown()
+    assert result == 1
+
+
+loaded_models = {"als": "old"}
+
+
+def get_loaded(model_name: str) -> str:
+    return loaded_models[model_name]
+
+
+def test_renewed_process_pool_sees_loaded_models() -> None:
+    executor = InferenceExecutor(executor="process", max_workers=1,
+                                 max_queue_size=0, timeout=5)
+
+    async def run() -> str:
+        return await executor.run(get_loaded, "als", fallback=lambda: "")
+
+    assert asyncio.run(run()) == "old"
+    # a model loaded lazily after the pool was forked
+    loaded_models["als"] = "new"
+    assert asyncio.run(run()) == "old"
+    executor.renew()
+    assert asyncio.run(run()) == "new"
+    executor.shutdown()
@@ -0,0 +1,130 @@
+import multiprocessing
+import threading
+import time
+import typing as tp
+from multiprocessing.connection import Connection
+
+from service.api.reload import ModelReloader, file_stamps
+
+
+def _reloader(
+    tmp_path,
+    served: tp.List[tp.Any],
+    build: tp.Callable[[], tp.Any],
+    **kwargs: tp.Any,
+) -> ModelReloader:
+    model_path = str(tmp_path / "model.dill")
+    return ModelReloader(
+        build=build,
+        swap=lambda models, stamps: served.__setitem__(0, models),
+        generation_path=str(tmp_path / "reload_generation"),
+        watch_paths=lambda: [model_path],
+        stamps=file_stamps([model_path]),
+        poll_interval=0.01,
+        **kwargs,
+    )
+
+
+def _wait(condition: tp.Callable[[], bool]) -> None:
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+
+
+def test_reload_swaps_built_models(tmp_path) -> None:
+    served: tp.List[int] = [0]
+    reloader = _reloader(tmp_path, served, build=lambda: served[0] + 1)
+    version = reloader.status()["version"]
+    (tmp_path / "model.dill").write_bytes(b"model")
+
+    assert reloader.reload(wait=True)
+    assert served == [1]
+    assert reloader.status()["version"] != version
+    assert not reloader.status()["reloading"]
+
+
+def test_failed_reload_keeps_current_models(tmp_path) -> None:
+    served: tp.List[str] = ["old"]
+
+    def build() -> str:
+        raise FileNotFoundError("model.dill")
+
+    reloader = _reloader(tmp_path, served, build=build)
+    version = reloader.status()["version"]
+    (tmp_path / "model.dill").write_bytes(b"model")
+
+    assert reloader.reload(wait=True)
+    assert served == ["old"]
+    assert reloader.status()["version"] == version
+    assert "model.dill" in reloader.status()["last_error"]
+
+
+def test_request_reloads_every_worker(tmp_path) -> None:
+    served = [["old"], ["old"]]
+    workers = [
+        _reloader(tmp_path, models, build=lambda: "new")
+        for models in served
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        workers[0].request()
+        _wait(lambda: served == [["new"], ["new"]])
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    assert served == [["new"], ["new"]]
+    assert workers[0].version == workers[1].version
+
+
+def _send_served(served: tp.List[str], connection: Connection) -> None:
+    connection.send(served[0])
+
+
+def test_fork_during_reload_serves_new_models(tmp_path) -> None:
+    served: tp.List[str] = ["old"]
+    loaded = threading.Event()
+
+    def build() -> str:
+        loaded.wait(5)
+        return "new"
+
+    reloader = _reloader(tmp_path, served, build=build)
+    reloader.block_forks()
+    assert reloader.reload()
+
+    # as a gunicorn master restarting a worker while it reloads
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_send_served, args=(served, sender))
+    forking = threading.Thread(target=child.start)
+    forking.start()
+    time.sleep(0.1)
+    assert forking.is_alive()
+
+    loaded.set()
+    forking.join(5)
+    assert receiver.recv() == "new"
+    child.join(5)
+    assert reloader.status()["reloads"] == 1
+
+
+def test_watch_reloads_changed_files(tmp_path) -> None:
+    served: tp.List[str] = ["old"]
+    reloader = _reloader(tmp_path, served, build=lambda: "new", watch=True)
+    reloader.start()
+    try:
+        (tmp_path / "model.dill").write_bytes(b"model")
+        _wait(lambda: served == ["new"])
+    finally:
+        reloader.stop()
+    assert served == ["new"]
+
+
+def test_file_stamps(tmp_path) -> None:
+    path = tmp_path / "model.dill"
+    assert file_stamps([str(path)]) == {str(path): None}
+    path.write_bytes(b"model")
+    assert file_stamps([str(path)])[str(path)][0] == 5
@@ -1,4 +1,8 @@
+import json
+import multiprocessing
+import time
 from http import HTTPStatus
+from typing import Iterator
 
 import pytest
 import yaml
@@ -15,16 +19,36 @@ def health_path() -> str:
     return "/health"
 
 
+@pytest.fixture
+def artifacts_path() -> str:
+    return "/health/artifacts"
+
+
+@pytest.fixture
+def reload_path() -> str:
+    return "/admin/reload"
+
+
 @pytest.fixture
 def reco_path() -> str:
     return "/reco/{model_name}/{user_id}"
 
 
+@pytest.fixture
+def reco_batch_path() -> str:
+    return "/reco/{model_name}/batch"
+
+
 @pytest.fixture
 def explain_path() -> str:
     return "/explain/{model_name}/{user_id}/{item_id}"
 
 
+@pytest.fixture
+def explain_batch_path() -> str:
+    return "/explain/{model_name}/{user_id}"
+
+
 def test_health(
     health_path,
     client: TestClient,
@@ -35,6 +59,57 @@ def test_health(
     assert response.status_code == HTTPStatus.OK
 
 
+def test_artifacts_memory(
+    artifacts_path,
+    client: TestClient,
+) -> None:
+    # artifacts loaded on import are shared with a forked process,
+    # as with workers of a preloaded gunicorn master
+    child = multiprocessing.get_context("fork").Process(
+        target=time.sleep, args=(30,),
+    )
+    child.start()
+    try:
+        time.sleep(0.1)
+        with client:
+            client.headers = {
+                "Authorization": f"Bearer {ENV_TOKEN['token']}"
+            }
+            response = client.get(artifacts_path)
+    finally:
+        child.terminate()
+        child.join()
+
+    assert response.status_code == HTTPStatus.OK
+    report = response.json()
+    for usage in report.values():
+        assert usage["resident_bytes"] >= usage["shared_bytes"]
+    assert report["interactions"]["shared_bytes"] > 0
+
+
+def test_reload_models(
+    reload_path,
+    reco_path,
+    client: TestClient,
+) -> None:
+    with client:
+        client.headers = {"Authorization": f"Bearer {ENV_TOKEN['token']}"}
+        response = client.post(reload_path)
+        assert response.status_code == HTTPStatus.OK
+
+        for _ in range(600):
+            status = client.get("/health/reload").json()
+            if not status["reloading"]:
+                break
+            time.sleep(0.1)
+
+        response = client.get(reco_path.format(model_name="als",
+                                               user_id=123))
+    assert status["reloads"] == 1
+    assert status["last_error"] is None
+    assert response.status_code == HTTPStatus.OK
+
+
 def test_get_reco_success(
     reco_path,
     client: TestClient,
@@ -90,6 +165,79 @@ def test_get_reco_with_incorrect_token(
     assert response.json()["errors"][0]["error_key"] == "token_is_not_correct"
 
 
+def test_get_reco_batch_success(
+    reco_batch_path,
+    client: TestClient,
+    service_config: ServiceConfig,
+) -> None:
+    user_ids = [123, 176549, 10 ** 10]
+    path = reco_batch_path.format(model_name="als")
+    with client:
+        client.headers = {"Authorization": f"Bearer {ENV_TOKEN['token']}"}
+        response = client.post(path, json={"user_ids": user_ids})
+    assert response.status_code == HTTPStatus.OK
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["user_id"] for line in lines) == sorted(user_ids)
+    for line in lines:
+        if line["user_id"] == 10 ** 10:
+            assert line["error_key"] == "user_not_found"
+        else:
+            assert len(line["items"]) == service_config.k_recs
+
+
+def test_get_reco_batch_ndjson(
+    reco_batch_path,
+    client: TestClient,
+) -> None:
+    path = reco_batch_path.format(model_name="als")
+    with client:
+        client.headers = {
+            "Authorization": f"Bearer {ENV_TOKEN['token']}",
+            "Content-Type": "application/x-ndjson",
+        }
+        response = client.post(path, data='123\n{"user_id": 176549}\nabc\n')
+    assert response.status_code == HTTPStatus.OK
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["error_key"] == "invalid_user_id"
+    assert [line["user_id"] for line in lines[1:]] == [123, 176549]
+
+
+def test_get_reco_batch_ndjson_in_chunks(
+    reco_batch_path,
+    client: TestClient,
+) -> None:
+    user_ids = [123, 176549, 56, 1]
+
+    def body() -> Iterator[bytes]:
+        # lines are split across chunks of the request body
+        text = "".join(f"{user_id}\n" for user_id in user_ids).encode()
+        for start in range(0, len(text), 3):
+            yield text[start:start + 3]
+
+    path = reco_batch_path.format(model_name="als")
+    with client:
+        client.headers = {
+            "Authorization": f"Bearer {ENV_TOKEN['token']}",
+            "Content-Type": "application/x-ndjson",
+        }
+        response = client.post(path, data=body())
+    assert response.status_code == HTTPStatus.OK
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["user_id"] for line in lines] == user_ids
+
+
+def test_get_reco_batch_for_unknown_model(
+    reco_batch_path,
+    client: TestClient,
+) -> None:
+    path = reco_batch_path.format(model_name="unknown")
+    with client:
+        client.headers = {"Authorization": f"Bearer {ENV_TOKEN['token']}"}
+        response = client.post(path, json={"user_ids": [123]})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
 def test_get_explain_user_in_train_success(
     explain_path,
     client: TestClient,
@@ -139,3 +287,20 @@ def test_get_explain_for_unknown_model(
         response = client.get(path)
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json()["errors"][0]["error_key"] == "model_not_found"
+
+
+def test_explain_batch_success(
+    explain_batch_path,
+    client: TestClient,
+) -> None:
+    item_ids = [14961, 2788, 10 ** 9]
+    path = explain_batch_path.format(model_name="als", user_id=176549)
+    with client:
+        client.headers = {"Authorization": f"Bearer {ENV_TOKEN['token']}"}
+        response = client.post(path, json={"item_ids": item_ids})
+    assert response.status_code == HTTPStatus.OK
+    explanations = response.json()["explanations"]
+    assert [row["item_id"] for row in explanations] == item_ids
+    for row in explanations:
+        assert isinstance(row["score"], int)
+        assert row["explanation"] != ""
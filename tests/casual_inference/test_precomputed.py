@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from service.casual_inference.precomputed import (
+    PrecomputedExplanations,
+    texts_path,
+)
+from service.utils import IdMapping
+from service.utils.columnar import columnar_path, file_stamp, write_table
+from service.utils.ragged import RaggedIndex
+
+
+def test_precomputed_get() -> None:
+    index = RaggedIndex.from_columns(
+        np.array([1, 2, 1]),
+        {
+            "item_id": np.array([10, 10, 11]),
+            "score": np.array([80, np.nan, 170], dtype=np.float32),
+            "text_id": np.array([0, -1, 0], dtype=np.int32),
+        },
+        keys=IdMapping(np.array([1, 2])),
+    )
+    precomputed = PrecomputedExplanations(index, np.array(["a", "b"]))
+
+    # scores are stored before post-processing, which clips them later
+    assert precomputed.get(1, [11, 12, 10]) == [
+        (170, "a"), None, (80, "a"),
+    ]
+    assert precomputed.get(2, [10]) == [(None, None)]
+    assert precomputed.get(3, [10]) == [None]
+
+
+def test_precomputed_load_checks_model_file(tmp_path) -> None:
+    path = str(tmp_path / "als.csv")
+    model_path = tmp_path / "als.dill"
+    model_path.write_bytes(b"model")
+
+    write_table(
+        pd.DataFrame({"text": np.array(["a"])}),
+        columnar_path(texts_path(path)),
+    )
+    write_table(
+        pd.DataFrame({
+            "user_id": np.array([1]),
+            "item_id": np.array([10]),
+            "score": np.array([80], dtype=np.float32),
+            "text_id": np.array([0], dtype=np.int32),
+        }),
+        columnar_path(path),
+        extra_meta={"model": file_stamp(str(model_path)), "scores": "raw"},
+    )
+
+    precomputed = PrecomputedExplanations.load(path, str(model_path))
+    assert precomputed.get(1, [10]) == [(80, "a")]
+
+    model_path.write_bytes(b"retrained model")
+    assert PrecomputedExplanations.load(path, str(model_path)) is None
+
+
+def test_precomputed_load_skips_post_processed_scores(tmp_path) -> None:
+    path = str(tmp_path / "als.csv")
+    model_path = tmp_path / "als.dill"
+    model_path.write_bytes(b"model")
+
+    write_table(
+        pd.DataFrame({"text": np.array(["a"])}),
+        columnar_path(texts_path(path)),
+    )
+    # built before scores were stored raw
+    write_table(
+        pd.DataFrame({
+            "user_id": np.array([1]),
+            "item_id": np.array([10]),
+            "score": np.array([80], dtype=np.int16),
+            "text_id": np.array([0], dtype=np.int32),
+        }),
+        columnar_path(path),
+        extra_meta={"model": file_stamp(str(model_path))},
+    )
+
+    assert PrecomputedExplanations.load(path, str(model_path)) is None
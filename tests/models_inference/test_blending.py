@@ -0,0 +1,36 @@
+import numpy as np
+
+from service.models_inference.knn_model.blending import IdfBlender
+
+
+def _idf_blend(item_idf: np.ndarray, recs, k_recs: int) -> list:
+    # the blend before weights: union of recs in idf order
+    recs = np.unique(np.concatenate(recs))
+    return item_idf[np.isin(item_idf, recs)][:k_recs].tolist()
+
+
+def test_default_blend_is_idf_order() -> None:
+    rng = np.random.default_rng(0)
+    item_idf = rng.permutation(200)
+    blender = IdfBlender(item_idf)
+    for _ in range(20):
+        recs = [rng.integers(0, 250, 30), rng.integers(0, 250, 30)]
+        assert blender.blend(recs, 10).tolist() == _idf_blend(
+            item_idf, recs, 10,
+        )
+
+
+def test_blend_orders_by_idf() -> None:
+    blender = IdfBlender(np.array([5, 3, 9, 1, 7]), weights=[0.0, 0.0])
+    assert blender.blend(([7, 1, 42], [9, 1]), 3).tolist() == [9, 1, 7]
+
+
+def test_blend_promotes_weighted_items() -> None:
+    blender = IdfBlender(np.array([5, 3, 9, 1, 7]), weights=[1.0, 0.5])
+    assert blender.blend(([7, 1], [5, 1]), 2).tolist() == [1, 7]
+    assert blender.blend(([7], [5, 3]), 3).tolist() == [7, 5, 3]
+
+
+def test_blend_empty() -> None:
+    blender = IdfBlender(np.array([5, 3]), weights=[1.0, 1.0])
+    assert blender.blend(([], [42]), 3).tolist() == []
@@ -0,0 +1,37 @@
+import numpy as np
+
+from service.models_inference.vector_model.exact_search import ExactIndex
+
+
+def test_exact_index_matches_full_sort() -> None:
+    rng = np.random.default_rng(23)
+    items = rng.normal(size=(500, 8)).astype(np.float32)
+    users = rng.normal(size=(7, 8)).astype(np.float32)
+    index = ExactIndex(items, batch_size=3)
+
+    results = index.knnQueryBatch(users, k=5)
+    assert len(results) == len(users)
+    for user, (ids, distances) in zip(users, results):
+        scores = items @ user
+        assert ids.tolist() == np.argsort(-scores)[:5].tolist()
+        assert np.allclose(distances, -scores[ids])
+
+    ids, _ = index.knnQuery(users[0], k=5)
+    assert ids.tolist() == results[0][0].tolist()
+
+
+def test_exact_index_k_larger_than_catalog() -> None:
+    index = ExactIndex(np.eye(3, dtype=np.float32))
+    ids, _ = index.knnQuery(np.array([0, 1, 0], dtype=np.float32), k=10)
+    assert ids[0] == 1
+    assert len(ids) == 3
+
+
+def test_exact_index_empty_results() -> None:
+    index = ExactIndex(np.eye(3, dtype=np.float32))
+    ids, distances = index.knnQuery(np.ones(3, dtype=np.float32), k=0)
+    assert len(ids) == len(distances) == 0
+
+    empty = ExactIndex(np.empty((0, 3), dtype=np.float32))
+    results = empty.knnQueryBatch(np.ones((2, 3), dtype=np.float32), k=5)
+    assert [len(ids) for ids, _ in results] == [0, 0]
@@ -0,0 +1,93 @@
+import numpy as np
+from scipy import sparse
+
+from service.models_inference.knn_model.neighbours import (
+    NeighbourTable,
+    load_table,
+    refresh_rows,
+    save_table,
+    select_neighbours,
+    top_n_per_row,
+)
+
+
+def test_top_n_per_row() -> None:
+    matrix = sparse.csr_matrix(np.array([
+        [1.0, 0.2, 0.0, 0.5],
+        [0.0, 0.0, 0.0, 0.0],
+        [0.3, 0.0, 0.9, 0.0],
+    ]))
+    indices, scores = top_n_per_row(matrix, 3, chunk_size=2)
+    assert indices.tolist() == [[0, 3, 1], [-1, -1, -1], [2, 0, -1]]
+    assert np.allclose(scores, [[1.0, 0.5, 0.2], [0, 0, 0], [0.9, 0.3, 0]])
+
+
+def test_neighbour_table_similar_items() -> None:
+    table = NeighbourTable(
+        np.array([[0, 3, 1], [2, -1, -1]], dtype=np.int32),
+        np.array([[1.0, 0.5, 0.2], [0.4, 0, 0]], dtype=np.float32),
+    )
+    ids, scores = table.similar_items(0, N=2)
+    assert ids.tolist() == [0, 3]
+    assert np.allclose(scores, [1.0, 0.5])
+
+    ids, _ = table.similar_items(np.array([0, 1]), N=3)
+    assert [row.tolist() for row in ids] == [[0, 3, 1], [2]]
+
+
+def test_select_neighbours_drops_padding() -> None:
+    # a batched similar_items call pads users with fewer neighbours
+    # than requested with row -1 and the lowest float32 score
+    lowest = np.finfo(np.float32).min
+    rows = np.array([4, 7, 2, -1, -1])
+    scores = np.array([1.0, 0.5, 0.2, lowest, lowest], dtype=np.float32)
+
+    assert select_neighbours(4, rows, scores, bmp=True).tolist() == [7, 2]
+    assert select_neighbours(4, rows, scores, bmp=False).tolist() == [7, 2]
+
+
+def test_refresh_rows(tmp_path) -> None:
+    model_path = str(tmp_path / "model.dill")
+    with open(model_path, "wb") as file:
+        file.write(b"model")
+
+    matrix = sparse.csr_matrix(np.array([[1.0, 0.5], [0.5, 1.0]]))
+    save_table(model_path, *top_n_per_row(matrix, 2))
+    assert load_table(model_path).indices.tolist() == [[0, 1], [1, 0]]
+
+    with open(model_path, "wb") as file:
+        file.write(b"retrained model")
+    assert load_table(model_path) is None
+
+    matrix = sparse.csr_matrix(np.array([[1.0, 0.5], [0.0, 0.7]]))
+    assert refresh_rows(model_path, matrix, np.array([0, 1]))
+    assert load_table(model_path).indices.tolist() == [[0, 1], [1, -1]]
+
+
+class RetrainedModel:
+    def similar_items(self, itemid: int, N: int = 10):
+        return np.array([itemid]), np.array([1.0])
+
+
+def test_partly_refreshed_rows_use_model(tmp_path) -> None:
+    model_path = str(tmp_path / "model.dill")
+    with open(model_path, "wb") as file:
+        file.write(b"model")
+    matrix = sparse.csr_matrix(np.array([[1.0, 0.5], [0.5, 1.0]]))
+    save_table(model_path, *top_n_per_row(matrix, 2))
+
+    with open(model_path, "wb") as file:
+        file.write(b"retrained model")
+    matrix = sparse.csr_matrix(np.array([[0.9, 0.0], [0.0, 0.7]]))
+    assert refresh_rows(model_path, matrix, np.array([1]))
+
+    table = load_table(model_path, load_fallback=lambda _: RetrainedModel())
+    # row 0 was built from the old model, so the model answers it
+    assert table.similar_items(0, N=2)[0].tolist() == [0]
+    assert table.similar_items(1, N=2)[0].tolist() == [1]
+    assert table.indices[0].tolist() == [0, 1]
+
+    assert refresh_rows(model_path, matrix, np.array([0]))
+    table = load_table(model_path, load_fallback=None)
+    assert table.current is None
+    assert table.similar_items(0, N=2)[0].tolist() == [0]
@@ -0,0 +1,45 @@
+import numpy as np
+
+from service.models_inference.popular.filler import PopularFiller
+from service.utils import IdMapping
+from service.utils.ragged import RaggedIndex
+
+
+def make_index(keys, column, values) -> RaggedIndex:
+    return RaggedIndex.from_columns(
+        np.array(keys),
+        {column: np.array(values)},
+        keys=IdMapping(np.unique(keys)),
+    )
+
+
+def test_fill_keeps_order_and_skips_recommended() -> None:
+    filler = PopularFiller(np.array([1, 2, 3, 4, 5]))
+    assert filler.fill(4, [9, 2, 7]) == [9, 2, 7, 1]
+    assert filler.fill(2, [9, 2, 7]) == [9, 2]
+
+
+def test_fill_drops_repeated_recommendations() -> None:
+    filler = PopularFiller(np.array([1, 2, 3, 4, 5]))
+    assert filler.fill(3, [9, 2, 9, 7]) == [9, 2, 7]
+    assert filler.fill(4, [2, 2, 2]) == [2, 1, 3, 4]
+
+
+def test_fill_skips_watched_while_possible() -> None:
+    watched = make_index([10, 10, 11], "item_id", [1, 3, 1])
+    filler = PopularFiller(np.array([1, 2, 3, 4]), watched=watched)
+    assert filler.fill(3, [], user_id=10) == [2, 4, 1]
+    assert filler.fill(3, [5], user_id=11) == [5, 2, 3]
+    assert filler.fill(3, [], user_id=12) == [1, 2, 3]
+
+
+def test_fill_uses_cohort_popular_first() -> None:
+    cohort_popular = make_index([0, 0, 1], "item_id", [7, 8, 9])
+    user_cohorts = make_index([10, 11], "cohort", [0, 1])
+    filler = PopularFiller(
+        np.array([1, 8, 2]),
+        cohort_popular=cohort_popular,
+        user_cohorts=user_cohorts,
+    )
+    assert filler.fill(4, [], user_id=10) == [7, 8, 1, 2]
+    assert filler.fill(2, [], user_id=12) == [1, 8]
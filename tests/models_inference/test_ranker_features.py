@@ -0,0 +1,86 @@
+import typing as tp
+
+import numpy as np
+import pandas as pd
+
+from service.models_inference.ranker_model.reco_ranker_model import RankerModel
+from service.utils import Columns, FeatureTable
+
+
+class ScoreByColumn:
+    """
+    Stands in for the classifier: scores rows by one feature
+    and keeps the frames it was given.
+    """
+
+    def __init__(self, column: str):
+        self.column = column
+        self.frames: tp.List[pd.DataFrame] = list()
+
+    def predict_proba(self, data: pd.DataFrame) -> np.ndarray:
+        self.frames.append(data)
+        score = data[self.column].to_numpy(dtype=np.float64)
+        return np.column_stack([1 - score, score])
+
+
+def _ranker() -> RankerModel:
+    ranker = RankerModel.__new__(RankerModel)
+    ranker.users_features = FeatureTable(
+        pd.DataFrame({
+            Columns.User: [1, 2],
+            "age": ["age_18_24", "age_25_34"],
+            "kids_flg": [0, 1],
+        }),
+        Columns.User,
+    )
+    ranker.items_features = FeatureTable(
+        pd.DataFrame({
+            Columns.Item: [10, 20, 30],
+            "genres": ["drama", "comedy", "horror"],
+            "item_pop": [0.5, 0.1, 0.9],
+        }),
+        Columns.Item,
+    )
+    ranker.column_features = [
+        "lfm_score", "rank", "age", "kids_flg", "genres", "item_pop",
+    ]
+    ranker.model = ScoreByColumn("item_pop")
+    return ranker
+
+
+def _candidates(item_ids: tp.List[int]) -> tp.Dict[str, np.ndarray]:
+    return {
+        Columns.Item: np.array(item_ids),
+        "lfm_score": np.linspace(1, 0, len(item_ids), dtype=np.float32),
+        "rank": np.arange(1, len(item_ids) + 1, dtype=np.int32),
+    }
+
+
+def test_ranker_features_are_typed() -> None:
+    ranker = _ranker()
+    assert ranker.recommend(1, 2, _candidates([10, 99, 30, 20])) == [30, 10]
+
+    frame = ranker.model.frames[0]
+    assert frame.columns.tolist() == ranker.column_features
+    assert not (frame.dtypes == object).any()
+    assert frame["kids_flg"].dtype == np.int64
+    assert frame["age"].tolist() == ["age_18_24"] * 3
+
+
+def test_ranker_batch_matches_single_user() -> None:
+    ranker = _ranker()
+    users = [1, 2, 3]
+    candidates = [_candidates([10, 20]), _candidates([30, 99, 10]),
+                  _candidates([20, 30])]
+
+    batch = ranker.recommend_batch(users, 2, candidates)
+    single = [
+        ranker.recommend(user_id, 2, user_candidates)
+        for user_id, user_candidates in zip(users, candidates)
+    ]
+    assert batch == single
+
+    # the unknown user has missing user features
+    frame = ranker.model.frames[0]
+    assert frame["age"].tolist()[-2:] == ["nan", "nan"]
+    assert np.isnan(frame["kids_flg"].to_numpy()[-2:]).all()
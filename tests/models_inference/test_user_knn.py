@@ -0,0 +1,88 @@
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import pytest
+
+nearest_neighbours = pytest.importorskip("implicit.nearest_neighbours")
+
+# pylint: disable=wrong-import-position
+from service.models_inference.knn_model.user_knn import UserKnn  # noqa
+
+
+def _train() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    pairs = {
+        (user_id, item_id)
+        for user_id, item_id in zip(
+            rng.integers(0, 40, 400), rng.integers(0, 30, 400)
+        )
+    }
+    users, items = zip(*sorted(pairs))
+    return pd.DataFrame({
+        "user_id": np.array(users) * 10 + 1000,
+        "item_id": np.array(items) * 7 + 5,
+    })
+
+
+def _reference(
+    model: UserKnn,
+    train: pd.DataFrame,
+    bmp25: bool,
+) -> tp.Dict[tp.Tuple[int, int], float]:
+    """
+    Scores of the per-user algorithm the vectorized predict replaced.
+    """
+    similarity = model.user_knn.similarity.toarray()
+    watched = train.groupby("user_id")["item_id"].apply(set)
+    idf = dict(zip(model.item_idf["index"], model.item_idf["idf"]))
+
+    scores = dict()
+    for user_id in train["user_id"].unique():
+        row = similarity[model.users_mapping[user_id]]
+        order = np.argsort(-row, kind="stable")
+        order = order[row[order] != 0][:model.N_users]
+        order = order[1:] if bmp25 else order[row[order] < 1]
+
+        best: tp.Dict[int, float] = dict()
+        for neighbour in order:
+            for item_id in watched[model.users_inv_mapping[neighbour]]:
+                best[item_id] = max(best.get(item_id, -np.inf), row[neighbour])
+        for item_id, sim in best.items():
+            scores[(user_id, item_id)] = sim * idf[item_id]
+    return scores
+
+
+@pytest.mark.parametrize(
+    "recommender, bmp25",
+    [("CosineRecommender", False), ("TFIDFRecommender", False),
+     ("BM25Recommender", True)],
+)
+def test_predict_matches_per_user_algorithm(recommender, bmp25) -> None:
+    train = _train()
+    model = UserKnn(getattr(nearest_neighbours, recommender)(K=100),
+                    N_users=100)
+    model.fit(train)
+
+    recs = model.predict(train, N_recs=1000, bmp25=bmp25, chunk_size=7)
+    expected = _reference(model, train, bmp25)
+
+    assert len(recs) == len(expected)
+    for user_id, item_id, score in recs[
+        ["user_id", "item_id", "score"]
+    ].itertuples(index=False):
+        assert score == pytest.approx(expected[(user_id, item_id)])
+
+
+def test_watched_keeps_zero_weight_interactions() -> None:
+    train = pd.DataFrame({
+        "user_id": [1, 1, 2], "item_id": [10, 20, 10], "weight": [0, 1, 2],
+    })
+    model = UserKnn(nearest_neighbours.CosineRecommender(K=5))
+    model.get_mappings(train)
+    model.get_matrix(train, weight_col="weight")
+
+    assert model.watched_csr.nnz == 3
+    assert model.watched_csr[model.users_mapping[1]].indices.tolist() == [
+        model.items_mapping[10], model.items_mapping[20],
+    ]
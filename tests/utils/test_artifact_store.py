@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import threading
+import time
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from service.utils.artifact_store import ArtifactStore, memory_usage
+
+
+def test_staging_store_replaces_artifacts() -> None:
+    store = ArtifactStore()
+    store.get_or_load("interactions", lambda: "interactions")
+    store.get_or_load("model", lambda: "old model")
+
+    staging = store.staging(keep=["interactions"])
+    seen: tp.List[str] = list()
+    with store.loading_into(staging):
+        assert store.get_or_load("model", lambda: "new model") == "new model"
+        assert store.get_or_load("interactions", lambda: "") == "interactions"
+
+        # other threads keep reading the current artifacts
+        thread = threading.Thread(
+            target=lambda: seen.append(store.get_or_load("model", str)),
+        )
+        thread.start()
+        thread.join()
+
+    assert seen == ["old model"]
+    assert store.get_or_load("model", str) == "old model"
+
+    store.replace(staging)
+    assert store.get_or_load("model", str) == "new model"
+    assert "interactions" in store
+
+
+def test_memory_usage_walks_artifacts() -> None:
+    artifact = {
+        "frame": pd.DataFrame({"a": np.zeros(10), "b": np.ones(10)}),
+        "matrix": sparse.csr_matrix(np.eye(4)),
+        "arrays": [np.zeros(8, dtype=np.int64)],
+    }
+    assert memory_usage(artifact)["nbytes"] >= 160 + 64
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/pagemap"),
+                    reason="pagemap is not available")
+def test_memory_usage_shared_after_fork() -> None:
+    array = np.ones(1 << 18)
+    assert memory_usage(array)["shared_bytes"] == 0
+
+    # pages loaded before fork are shared with the child
+    child = multiprocessing.get_context("fork").Process(
+        target=time.sleep, args=(10,),
+    )
+    child.start()
+    try:
+        time.sleep(0.1)
+        assert memory_usage(array)["shared_bytes"] >= array.nbytes
+    finally:
+        child.terminate()
+        child.join()
+
+
+def test_memory_report_includes_details() -> None:
+    store = ArtifactStore()
+
+    def load(source: str) -> str:
+        store.describe("index", index_source=source)
+        return source
+
+    store.get_or_load("index", lambda: load("loaded"))
+    assert store.memory_report()["index"]["index_source"] == "loaded"
+
+    # details of a reloaded artifact replace the old ones
+    staging = store.staging()
+    with store.loading_into(staging):
+        store.get_or_load("index", lambda: load("built"))
+    assert store.memory_report()["index"]["index_source"] == "loaded"
+    store.replace(staging)
+    assert store.memory_report()["index"]["index_source"] == "built"
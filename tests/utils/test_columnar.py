@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from service.utils.columnar import (
+    columnar_path,
+    convert_csv,
+    read_columns,
+    read_table,
+)
+
+
+def test_read_table_falls_back_to_csv(tmp_path) -> None:
+    csv_path = str(tmp_path / "table.csv")
+    pd.DataFrame({"user_id": [1, 2], "score": [0.5, 0.1]}).to_csv(
+        csv_path, index=False
+    )
+    table = read_table(csv_path, ["user_id"])
+    assert table.columns.tolist() == ["user_id"]
+    assert table["user_id"].tolist() == [1, 2]
+
+
+def test_converted_table_roundtrip(tmp_path) -> None:
+    csv_path = str(tmp_path / "items.csv")
+    df = pd.DataFrame({
+        "item_id": [10, 20, 30],
+        "genres": ["drama", None, "comedy, drama"],
+        "score": [0.1, 0.2, 0.3],
+    })
+    df.to_csv(csv_path, index=False)
+
+    assert convert_csv(csv_path) == columnar_path(csv_path)
+
+    columns = read_columns(csv_path, ["item_id", "score"])
+    assert isinstance(columns["item_id"], np.memmap)
+    assert columns["score"].tolist() == [0.1, 0.2, 0.3]
+
+    table = read_table(csv_path)
+    assert table["item_id"].tolist() == [10, 20, 30]
+    assert table["genres"].isna().tolist() == [False, True, False]
+    assert table["genres"].iloc[2] == "comedy, drama"
+
+
+def _mapped_file(array: np.ndarray) -> str:
+    address = array.__array_interface__["data"][0]
+    with open("/proc/self/maps") as maps:
+        for line in maps:
+            fields = line.split()
+            start, end = (int(value, 16) for value in fields[0].split("-"))
+            if start <= address < end:
+                return fields[5] if len(fields) > 5 else ""
+    return ""
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"),
+                    reason="maps are not available")
+def test_read_table_keeps_columns_mapped(tmp_path) -> None:
+    csv_path = str(tmp_path / "interactions.csv")
+    pd.DataFrame({"user_id": [1, 2, 3], "item_id": [4, 5, 6]}).to_csv(
+        csv_path, index=False
+    )
+    path = convert_csv(csv_path)
+
+    table = read_table(csv_path)
+    for idx, column in enumerate(["user_id", "item_id"]):
+        assert _mapped_file(table[column].to_numpy()) == os.path.realpath(
+            os.path.join(path, f"col_{idx}.npy")
+        )
+
+
+def test_stale_table_falls_back_to_csv(tmp_path) -> None:
+    csv_path = str(tmp_path / "items.csv")
+    pd.DataFrame({"item_id": [1, 2]}).to_csv(csv_path, index=False)
+    convert_csv(csv_path)
+
+    pd.DataFrame({"item_id": [1, 2, 3]}).to_csv(csv_path, index=False)
+    assert read_columns(csv_path)["item_id"].tolist() == [1, 2, 3]
+    assert read_table(csv_path)["item_id"].tolist() == [1, 2, 3]
+
+    convert_csv(csv_path)
+    assert isinstance(read_columns(csv_path)["item_id"], np.memmap)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from service.utils import IdMapping
+
+
+def test_id_mapping_keeps_first_seen_order() -> None:
+    mapping = IdMapping.from_values([5, 3, 5, 9, 1])
+    assert mapping.external_ids.tolist() == [5, 3, 9, 1]
+    assert mapping.to_internal([1, 9, 3, 5]).tolist() == [3, 2, 1, 0]
+    assert mapping.to_external([0, 3]).tolist() == [5, 1]
+
+
+def test_id_mapping_unknown_ids() -> None:
+    mapping = IdMapping.from_values(np.array([10, 20]))
+    assert mapping.to_internal([15, 30, -1]).tolist() == [-1, -1, -1]
+    assert 20 in mapping
+    assert 15 not in mapping
+    assert mapping[20] == 1
+
+
+def test_id_mapping_dense_and_sparse_ids_agree() -> None:
+    ids = np.array([7, 3, 12, 5])
+    dense = IdMapping(ids)
+    sparse = IdMapping(ids * 10 ** 9)
+    assert dense._dense is not None  # pylint: disable=protected-access
+    assert sparse._dense is None  # pylint: disable=protected-access
+
+    queries = np.array([12, 4, 3, 100, -5, 7])
+    expected = [2, -1, 1, -1, -1, 0]
+    assert dense.to_internal(queries).tolist() == expected
+    assert sparse.to_internal(queries * 10 ** 9).tolist() == expected
+    assert [dense.lookup(int(query)) for query in queries] == expected
+    assert dense.to_internal(np.array([12.0, 4.5])).tolist() == [2, -1]
+
+
+def test_id_mapping_repeated_ids_map_to_first() -> None:
+    mapping = IdMapping(np.array([4, 2, 4]))
+    assert mapping[4] == 0
+    assert mapping.to_internal([4, 2]).tolist() == [0, 1]
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from service.utils.model_export import (
+    export_model,
+    exported_path,
+    load_exported,
+)
+
+
+def _user_items() -> sparse.csr_matrix:
+    rng = np.random.default_rng(0)
+    return sparse.csr_matrix(
+        (rng.random((20, 15)) > 0.7).astype(np.float32)
+    )
+
+
+def _touch(path: str) -> str:
+    with open(path, "wb") as file:
+        file.write(b"model")
+    return path
+
+
+def test_export_unsupported_model(tmp_path) -> None:
+    model_path = _touch(str(tmp_path / "model.dill"))
+    with pytest.raises(TypeError):
+        export_model(object(), model_path)
+    assert load_exported(model_path) is None
+
+
+def test_knn_export_roundtrip(tmp_path) -> None:
+    nearest_neighbours = pytest.importorskip("implicit.nearest_neighbours")
+    model = nearest_neighbours.CosineRecommender(K=5)
+    model.fit(_user_items())
+
+    model_path = _touch(str(tmp_path / "knn.dill"))
+    export_model(model, model_path)
+    loaded = load_exported(model_path)
+
+    assert type(loaded) is type(model)
+    # views of read-only memory maps
+    assert not loaded.similarity.data.flags.writeable
+    assert (loaded.similarity != model.similarity).nnz == 0
+    for expected, actual in zip(
+        model.similar_items(3, N=4), loaded.similar_items(3, N=4),
+    ):
+        np.testing.assert_allclose(expected, actual)
+
+
+def test_als_export_roundtrip(tmp_path) -> None:
+    als = pytest.importorskip("implicit.cpu.als")
+    model = als.AlternatingLeastSquares(factors=4, iterations=2,
+                                        random_state=0)
+    user_items = _user_items()
+    model.fit(user_items)
+
+    model_path = _touch(str(tmp_path / "als.dill"))
+    export_model(model, model_path)
+    loaded = load_exported(model_path)
+
+    np.testing.assert_array_equal(loaded.item_factors, model.item_factors)
+    assert loaded.regularization == model.regularization
+    expected = model.explain(1, user_items[1], itemid=2)
+    actual = loaded.explain(1, user_items[1], itemid=2)
+    assert actual[0] == pytest.approx(expected[0])
+
+
+def test_export_of_another_model_file_is_not_used(tmp_path) -> None:
+    nearest_neighbours = pytest.importorskip("implicit.nearest_neighbours")
+    model = nearest_neighbours.CosineRecommender(K=5)
+    model.fit(_user_items())
+
+    model_path = _touch(str(tmp_path / "knn.dill"))
+    export_model(model, model_path)
+    with open(model_path, "ab") as file:
+        file.write(b"retrained")
+
+    assert os.path.isdir(exported_path(model_path))
+    assert load_exported(model_path) is None
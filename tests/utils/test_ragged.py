@@ -0,0 +1,27 @@
+import numpy as np
+
+from service.utils import RaggedIndex
+from service.utils.ragged import unique_first_seen
+
+
+def test_ragged_index_groups_rows_in_order() -> None:
+    index = RaggedIndex.from_columns(
+        np.array([7, 3, 7, 5, 3, 7]),
+        {"item_id": np.array([1, 2, 3, 4, 5, 1], dtype=np.int32)},
+    )
+    assert index.indptr.tolist() == [0, 3, 5, 6]
+    assert index.get(7, "item_id").tolist() == [1, 3, 1]
+    assert index.get(9, "item_id").tolist() == []
+    assert 3 in index
+    assert 9 not in index
+
+
+def test_ragged_index_gather() -> None:
+    index = RaggedIndex.from_columns(
+        np.array([7, 3, 7, 5, 3, 7]),
+        {"item_id": np.array([1, 2, 3, 4, 5, 1], dtype=np.int32)},
+    )
+    gathered = index.gather([5, 7, 9, 3], "item_id")
+    assert gathered.tolist() == [4, 1, 3, 1, 2, 5]
+    assert unique_first_seen(gathered).tolist() == [4, 1, 3, 2, 5]
+    assert index.gather([], "item_id").tolist() == []